@@ -10,23 +10,32 @@ if str(SRC) not in sys.path:
 
 from oven_time.config import TELEGRAM_TOKEN
 from oven_time.bot_commands import *
+from oven_time.admission import AdmissionControl
+from oven_time.logs import setup_logging
 
 async def on_startup(application):
-    application.create_task(background_job(application))
+    application.create_task(watch_data_job(application))
+    application.create_task(flush_subscribers_job(application))
+    application.create_task(admission_stats_job(application))
+
+async def on_shutdown(application):
+    # écrit les derniers abonnements en attente
+    get_subscribers(application).close()
 
 
 def main():
+    # Logs JSON écrits par un thread de fond : la boucle d'événements n'attend jamais la sortie
+    setup_logging()
     
     #Launch the bot
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-    app.add_handler(CommandHandler("m", now))
-    app.add_handler(CommandHandler("a", at))
-    app.add_handler(CommandHandler("q", window))
-    app.add_handler(CommandHandler("start_auto", start_auto))
-    app.add_handler(CommandHandler("stop_auto", stop_auto))
+    # Contrôle d'admission devant les handlers (débit par chat, priorité aux commandes peu coûteuses, file bornée)
+    app = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(AdmissionControl()).build()
+    for command, callback in COMMANDS.items():
+        app.add_handler(CommandHandler(command, callback))
 
     # enregistrement du callback de startup
     app.post_init = on_startup
+    app.post_shutdown = on_shutdown
 
     app.run_polling()
 
@@ -0,0 +1,24 @@
+import sys
+import argparse
+from pathlib import Path
+
+# Ajouter src au PYTHONPATH
+ROOT = Path(__file__).resolve().parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from oven_time.config import WORKER_FREQ
+from oven_time.worker import run_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OvenTime ingest worker (eco2mix + day-ahead prices)")
+    parser.add_argument("--freq", type=int, default=WORKER_FREQ, help="Minutes between two update attempts")
+    parser.add_argument("--once", action="store_true", help="Run a single ingest cycle and exit (benchmarking)")
+    args = parser.parse_args()
+
+    run_worker(freq=args.freq, once=args.once)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import time
+import heapq
+import asyncio
+import logging
+import functools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.ext import BaseUpdateProcessor
+
+from oven_time.logs import log_event
+from oven_time.config import (
+    ADMISSION_WORKERS, ADMISSION_BACKLOG, CHAT_RATE, CHAT_BURST, EXPENSIVE_DELAY, EXPENSIVE_WORKERS, EXPENSIVE_TIMEOUT,
+    LOG_SAMPLE_RATE
+)
+
+BUSY_TEXT = "⏳ Le bot est très sollicité, réessayez dans quelques instants."
+RATE_LIMITED_TEXT = "⏳ Trop de commandes d'un coup, réessayez dans quelques secondes."
+
+# Commands far more costly than a cached read: /a parses free text with dateparser and computes a past diagnostic
+# (their handlers run that work through run_expensive)
+EXPENSIVE_COMMANDS = {"a"}
+
+STATS = ("admitted", "queued", "completed", "rate_limited", "rejected")
+
+logger = logging.getLogger(__name__)
+
+# Threads running the blocking part of expensive commands, and slots currently taken
+_EXPENSIVE = {"executor": None, "running": 0, "stats": Counter()}
+
+
+class Overloaded(Exception):
+    """Every slot for expensive work is taken."""
+
+
+async def run_expensive(func, *args, workers: int = EXPENSIVE_WORKERS, timeout: float = EXPENSIVE_TIMEOUT, **kwargs):
+    """
+    Run the blocking call func(*args, **kwargs) in a worker thread, so that the event loop keeps serving
+    cheap commands and alerts meanwhile.
+
+    :param workers: Calls running at once, beyond which the call is refused
+    :param timeout: Time budget (in seconds). A call over budget keeps its slot until its thread is done.
+    :raises Overloaded: Every slot is taken
+    :raises TimeoutError: No result within <timeout>
+    """
+    if _EXPENSIVE["running"] >= workers:
+        _EXPENSIVE["stats"]["rejected"] += 1
+        raise Overloaded
+    if _EXPENSIVE["executor"] is None:
+        _EXPENSIVE["executor"] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expensive")
+    _EXPENSIVE["running"] += 1
+    future = asyncio.get_running_loop().run_in_executor(_EXPENSIVE["executor"], functools.partial(func, *args, **kwargs))
+    future.add_done_callback(_expensive_done)
+    try:
+        # Shielded: a call over budget cannot be stopped, its slot is freed when its thread actually returns
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except TimeoutError:
+        _EXPENSIVE["stats"]["timed_out"] += 1
+        raise
+
+
+def _expensive_done(future):
+    _EXPENSIVE["running"] -= 1
+    if not future.cancelled():
+        future.exception()  # already raised to the caller, or nobody waits for it any more (over budget)
+
+
+def command_name(update) -> str:
+    """Bot command of <update> without its slash and bot name ("m" for "/m@oventime_bot"), None if not a command."""
+    message = getattr(update, "effective_message", None)
+    text = getattr(message, "text", None) or ""
+    parts = text[1:].split(maxsplit=1) if text.startswith("/") else []
+    return parts[0].split("@", 1)[0].lower() if parts else None
+
+
+class AdmissionControl(BaseUpdateProcessor):
+    """
+    Update processor (ApplicationBuilder.concurrent_updates) putting admission control in front of the handlers:
+
+    - each chat has a token bucket (<burst> commands at once, <rate> per second sustained): beyond it, its commands
+      are dropped, with a single "slow down" reply per streak (other updates are not rate limited);
+    - at most <workers> updates are handled at a time, the others wait in a priority queue where expensive commands
+      (EXPENSIVE_COMMANDS) are served as if they had arrived <expensive_delay> seconds later: cheap cached commands
+      go first during a burst, expensive ones still get through;
+    - the queue holds at most <backlog> updates: beyond it, updates get an immediate "busy" reply instead of waiting.
+
+    Rejections cost no handler work, and the blocking part of expensive commands runs outside the event loop
+    (run_expensive), so an overload shows up as rejected requests rather than as event-loop lag.
+    Counters and queue depth: `snapshot()`. Handled and rejected updates are logged as "command" events,
+    sampled at <sample_rate>.
+
+    :param on_reject: Called with (update, reason) for every rejected update, reason in "rate_limited", "rejected"
+    """
+
+    def __init__(
+            self,
+            workers: int = ADMISSION_WORKERS,
+            backlog: int = ADMISSION_BACKLOG,
+            rate: float = CHAT_RATE,
+            burst: float = CHAT_BURST,
+            expensive_delay: float = EXPENSIVE_DELAY,
+            sample_rate: float = LOG_SAMPLE_RATE,
+            on_reject=None
+            ):
+        # The base class semaphore is only a safety net: updates are admitted, queued or rejected here,
+        # and a rejection returns without awaiting anything
+        super().__init__(max_concurrent_updates=workers + backlog + 1)
+        self.workers = workers
+        self.backlog = backlog
+        self.rate = rate
+        self.burst = burst
+        self.expensive_delay = expensive_delay
+        self.sample_rate = sample_rate
+        self.on_reject = on_reject
+        self.stats = Counter()
+        self.peak_queued = 0
+        self._running = 0
+        self._queue = []      # heap of (service key, sequence number, future resolved when a worker is handed over)
+        self._seq = 0
+        self._buckets = {}    # chat_id -> [tokens, last refill (monotonic), "slow down" already sent]
+        self._replies = set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._replies:
+            await asyncio.gather(*self._replies, return_exceptions=True)
+
+    def snapshot(self, reset_peak: bool = False) -> dict:
+        """
+        :param reset_peak: Start a new measurement period for the peak queue depth
+        :return: {"running", "queue_depth", "peak_queue_depth", "admitted", "queued", "completed", "rate_limited", "rejected",
+            "expensive_running", "expensive_rejected", "expensive_timed_out"}
+        :rtype: dict
+        """
+        result = {"running": self._running, "queue_depth": len(self._queue), "peak_queue_depth": self.peak_queued,
+                  **{name: self.stats[name] for name in STATS},
+                  "expensive_running": _EXPENSIVE["running"],
+                  **{f"expensive_{name}": _EXPENSIVE["stats"][name] for name in ("rejected", "timed_out")}}
+        if reset_peak:
+            self.peak_queued = len(self._queue)
+        return result
+
+    def _take_token(self, chat_id, now: float) -> bool:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= 10_000:
+                # Buckets that are full again carry no information
+                self._buckets = {k: b for k, b in self._buckets.items() if b[0] + (now - b[1]) * self.rate < self.burst}
+            bucket = self._buckets[chat_id] = [self.burst, now, False]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        bucket[2] = False
+        return True
+
+    def _reject(self, update, command, coroutine, reason: str, text: str = None):
+        coroutine.close()
+        self.stats[reason] += 1
+        log_event(logger, "command", sample_rate=self.sample_rate, command=command, outcome=reason)
+        if self.on_reject is not None:
+            self.on_reject(update, reason)
+        message = getattr(update, "effective_message", None)
+        if text is not None and message is not None:
+            # Not awaited: the reply must not hold the update processor
+            task = asyncio.create_task(message.reply_text(text))
+            self._replies.add(task)
+            task.add_done_callback(self._reply_done)
+
+    def _reply_done(self, task):
+        self._replies.discard(task)
+        if not task.cancelled():
+            task.exception()  # blocked chats etc.: nothing to do for a "busy" reply
+
+    async def do_process_update(self, update, coroutine):
+        now = time.monotonic()
+        command = command_name(update)
+        chat = getattr(update, "effective_chat", None)
+        if command is not None and chat is not None and not self._take_token(chat.id, now):
+            bucket = self._buckets[chat.id]
+            self._reject(update, command, coroutine, "rate_limited", None if bucket[2] else RATE_LIMITED_TEXT)
+            bucket[2] = True
+            return
+
+        if self._running < self.workers:
+            self._running += 1
+        elif len(self._queue) >= self.backlog:
+            self._reject(update, command, coroutine, "rejected", BUSY_TEXT)
+            return
+        else:
+            key = now + (self.expensive_delay if command in EXPENSIVE_COMMANDS else 0)
+            future = asyncio.get_running_loop().create_future()
+            self._seq += 1
+            heapq.heappush(self._queue, (key, self._seq, future))
+            self.stats["queued"] += 1
+            self.peak_queued = max(self.peak_queued, len(self._queue))
+            try:
+                # Resolved by a finishing update, which hands its worker over
+                await future
+            except asyncio.CancelledError:
+                coroutine.close()
+                if future.done() and not future.cancelled():
+                    # Cancelled right after being handed a worker: pass it on
+                    self._release()
+                raise
+
+        self.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            await coroutine
+        finally:
+            self.stats["completed"] += 1
+            self._release()
+            log_event(logger, "command", sample_rate=self.sample_rate, command=command, outcome="handled",
+                      wait_ms=round((started - now) * 1000, 1), duration_ms=round((time.monotonic() - started) * 1000, 1))
+
+    def _release(self):
+        """Hand the worker of a finished update over to the first waiting update, or free it."""
+        while self._queue:
+            _, _, waiting = heapq.heappop(self._queue)
+            if not waiting.done():
+                waiting.set_result(None)
+                return
+        self._running -= 1
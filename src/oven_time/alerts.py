@@ -0,0 +1,272 @@
+import time
+import sqlite3
+from pathlib import Path
+
+from oven_time.config import DATA_DIR, COUNTRY_CODE, HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD
+
+HIGH_START, HIGH_END, LOW_START, LOW_END = "high_start", "high_end", "low_start", "low_end"
+
+SUBSCRIBERS_DB = DATA_DIR / "subscribers.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id    INTEGER NOT NULL,
+    zone       TEXT    NOT NULL,
+    alert_type TEXT    NOT NULL,            -- 'high' (abundance) | 'low' (tension) | 'window' (low-price window reminder)
+    threshold  REAL    NOT NULL,            -- score threshold, or horizon in hours for 'window' 
+    active     INTEGER NOT NULL DEFAULT 0,  -- alert currently on for this chat
+    pending    INTEGER NOT NULL DEFAULT 1,  -- added since the last update, evaluated whatever its threshold
+    created_at REAL    NOT NULL,
+    PRIMARY KEY (chat_id, zone, alert_type)
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_chat ON subscriptions (chat_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_threshold ON subscriptions (zone, alert_type, threshold, chat_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_pending ON subscriptions (zone, alert_type) WHERE pending = 1;
+CREATE TABLE IF NOT EXISTS scores (
+    zone  TEXT PRIMARY KEY,
+    score REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS window_reminders (
+    zone       TEXT NOT NULL,
+    hours      REAL NOT NULL,               -- horizon of the reminder
+    window_end REAL NOT NULL,               -- end of the last window reminded (unix time)
+    PRIMARY KEY (zone, hours)
+);
+"""
+
+
+class SubscriberStore:
+    """
+    Durable alert subscriptions (SQLite, WAL mode), one row per chat, zone and alert type.
+
+    An "abundance" alert is on for a chat while score > its high threshold, a "tension" alert while score < its low threshold.
+    When the score moves from `old` to `new`, only the rows whose thresholds lie between the two can change state:
+    they are read through the (zone, alert_type, threshold) index in pages, so a score update costs
+    O(log n + affected chats) and never loads the whole subscriber base in memory.
+
+    Low-price window reminders are stored in the same table (alert type 'window', horizon in hours as threshold).
+
+    Writes from the bot commands are queued and applied in batches (`flush`), at the latest before the next score update.
+    """
+
+    def __init__(self, path: Path = SUBSCRIBERS_DB, zone: str = COUNTRY_CODE, batch_size: int = 100):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.zone = zone
+        self.batch_size = batch_size
+        self._queue = []   # ("add", chat_id, high, low) | ("add_window", chat_id, hours) | ("remove", chat_id, alert_types)
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM subscriptions WHERE zone = ? AND alert_type = 'high'", (self.zone,)
+        ).fetchone()[0]
+
+    def __contains__(self, chat_id):
+        self.flush()
+        return self.conn.execute(
+            "SELECT 1 FROM subscriptions WHERE chat_id = ? AND zone = ? AND alert_type = 'high'", (chat_id, self.zone)
+        ).fetchone() is not None
+
+    @property
+    def last_score(self):
+        row = self.conn.execute("SELECT score FROM scores WHERE zone = ?", (self.zone,)).fetchone()
+        return None if row is None else row[0]
+
+    def add(self, chat_id, high: float = HIGH_SCORE_THRESHOLD, low: float = LOW_SCORE_THRESHOLD):
+        """
+        Subscribe <chat_id> (or update its thresholds). The chat starts with no alert on: if the score is already
+        beyond one of its thresholds, it is notified at the next update.
+        """
+        self._queue.append(("add", chat_id, high, low))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def remove(self, chat_id, alert_types=("high", "low")):
+        """Unsubscribe <chat_id> from score alerts (by default) or from the given alert types."""
+        self._queue.append(("remove", chat_id, tuple(alert_types)))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def forget(self, chat_id):
+        """Remove every subscription of <chat_id> (bot blocked, chat deleted)."""
+        self.remove(chat_id, alert_types=("high", "low", "window"))
+
+    def add_window(self, chat_id, hours: float):
+        """Subscribe <chat_id> to reminders at the start of the recommended low-price window within <hours> hours."""
+        self._queue.append(("add_window", chat_id, hours))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def remove_window(self, chat_id):
+        self.remove(chat_id, alert_types=("window",))
+
+    def window_horizons(self) -> list:
+        """Distinct horizons (in hours) of the window reminders subscribed to."""
+        self.flush()
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT threshold FROM subscriptions WHERE zone = ? AND alert_type = 'window' ORDER BY threshold",
+            (self.zone,),
+        )]
+
+    def reminded_until(self, hours: float):
+        """End (unix time) of the last low-price window reminded over <hours> hours, None if none yet."""
+        row = self.conn.execute(
+            "SELECT window_end FROM window_reminders WHERE zone = ? AND hours = ?", (self.zone, hours)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set_reminded(self, hours: float, window_end: float):
+        """Record that the window ending at <window_end> (unix time) was reminded over <hours> hours."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO window_reminders (zone, hours, window_end) VALUES (?, ?, ?)",
+                (self.zone, hours, window_end),
+            )
+
+    def window_subscribers(self, hours: float, page_size: int = 500):
+        """Chats subscribed to window reminders over <hours> hours, page by page (lists of chat ids)."""
+        self.flush()
+        last = None
+        while True:
+            rows = self.conn.execute(
+                "SELECT chat_id FROM subscriptions WHERE zone = ? AND alert_type = 'window' AND threshold = ? "
+                "AND chat_id > ? ORDER BY chat_id LIMIT ?",
+                (self.zone, hours, -2**63 if last is None else last, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            last = rows[-1][0]
+
+    def flush(self) -> int:
+        """
+        Apply queued subscriptions / unsubscriptions in a single transaction.
+
+        :return: Number of queued operations applied
+        :rtype: int
+        """
+        if not self._queue:
+            return 0
+        queue, self._queue = self._queue, []
+        now = time.time()
+        with self.conn:
+            for op in queue:
+                if op[0] == "add":
+                    _, chat_id, high, low = op
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO subscriptions (chat_id, zone, alert_type, threshold, active, pending, created_at) "
+                        "VALUES (?, ?, ?, ?, 0, 1, ?)",
+                        [(chat_id, self.zone, "high", high, now), (chat_id, self.zone, "low", low, now)],
+                    )
+                elif op[0] == "add_window":
+                    _, chat_id, hours = op
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO subscriptions (chat_id, zone, alert_type, threshold, active, pending, created_at) "
+                        "VALUES (?, ?, 'window', ?, 0, 0, ?)",
+                        (chat_id, self.zone, hours, now),
+                    )
+                else:
+                    _, chat_id, alert_types = op
+                    self.conn.execute(
+                        f"DELETE FROM subscriptions WHERE chat_id = ? AND zone = ? AND alert_type IN ({','.join('?' * len(alert_types))})",
+                        (chat_id, self.zone, *alert_types),
+                    )
+        return len(queue)
+
+    def _set_active(self, alert_type: str, chat_ids: list, on: bool):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE subscriptions SET active = ?, pending = 0 WHERE chat_id = ? AND zone = ? AND alert_type = ?",
+                [(int(on), chat_id, self.zone, alert_type) for chat_id in chat_ids],
+            )
+
+    def _range_pages(self, alert_type: str, lo: float, hi: float, include_lo: bool, page_size: int):
+        """
+        Keyset pagination over (threshold, chat_id) for thresholds between lo and hi.
+        """
+        lo_op, hi_op = (">=", "<") if include_lo else (">", "<=")
+        last = (lo, None)
+        while True:
+            if last[1] is None:
+                key_clause, key_args = f"threshold {lo_op} ?", (lo,)
+            else:
+                key_clause, key_args = "(threshold, chat_id) > (?, ?)", last
+            rows = self.conn.execute(
+                f"SELECT threshold, chat_id, active FROM subscriptions "
+                f"WHERE zone = ? AND alert_type = ? AND {key_clause} AND threshold {hi_op} ? "
+                f"ORDER BY threshold, chat_id LIMIT ?",
+                (self.zone, alert_type, *key_args, hi, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][:2]
+
+    def _pending_pages(self, alert_type: str, page_size: int):
+        while True:
+            rows = self.conn.execute(
+                "SELECT threshold, chat_id, active FROM subscriptions "
+                "WHERE zone = ? AND alert_type = ? AND pending = 1 LIMIT ?",
+                (self.zone, alert_type, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE subscriptions SET pending = 0 WHERE chat_id = ? AND zone = ? AND alert_type = ?",
+                    [(chat_id, self.zone, alert_type) for _, chat_id, _ in rows],
+                )
+
+    def update(self, score: float, page_size: int = 500):
+        """
+        Move to a new score and yield the chats to notify, page by page: (kind, [chat_id, ...]) with kind in
+        HIGH_START, HIGH_END, LOW_START, LOW_END. The alert states of a page are saved once the consumer asks for the
+        next one, and the new score once every page is consumed: an interrupted fan-out is resumed at the next update
+        (the chats of the page being sent may be notified twice, none is skipped).
+        An undefined (NaN) score leaves every state unchanged.
+        """
+        self.flush()
+        if score != score:
+            return
+
+        old = self.last_score
+
+        # "high" on while score > h: (old > h) != (score > h) <=> min <= h < max
+        # "low" on while score < l: (old < l) != (score < l) <=> min < l <= max
+        sources = [
+            ("high", self._range_pages(
+                "high", min(score, old) if old is not None else float("-inf"),
+                max(score, old) if old is not None else score, True, page_size)),
+            ("low", self._range_pages(
+                "low", min(score, old) if old is not None else score,
+                max(score, old) if old is not None else float("inf"), False, page_size)),
+            ("high", self._pending_pages("high", page_size)),
+            ("low", self._pending_pages("low", page_size)),
+        ]
+
+        for alert_type, pages in sources:
+            start_kind, end_kind = (HIGH_START, HIGH_END) if alert_type == "high" else (LOW_START, LOW_END)
+            for rows in pages:
+                turned_on, turned_off = [], []
+                for threshold, chat_id, active in rows:
+                    on = score > threshold if alert_type == "high" else score < threshold
+                    if on != bool(active):
+                        (turned_on if on else turned_off).append(chat_id)
+                if turned_on:
+                    yield start_kind, turned_on
+                if turned_off:
+                    yield end_kind, turned_off
+                self._set_active(alert_type, turned_on, True)
+                self._set_active(alert_type, turned_off, False)
+
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO scores (zone, score) VALUES (?, ?)", (self.zone, score))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,410 @@
+import re
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from oven_time.config import DATA_DIR, RETENTION_DAYS
+from oven_time import clock, data_processing
+from oven_time.data_download import ECO2MIX_URL, eco2mix_df, atomic_to_parquet
+
+ECO2MIX_EXPORT_URL = ECO2MIX_URL.rsplit("/records", 1)[0] + "/exports/csv"
+ARCHIVE_DIR = DATA_DIR / "raw" / "eco2mix_archive"
+STRING_COLUMNS = ["perimetre", "nature", "date", "heure"]
+
+
+def month_ranges(start: pd.Timestamp, end: pd.Timestamp) -> list:
+    """
+    Split [start, end) into calendar-month chunks (UTC), one archive partition per month.
+
+    :return: List of (label "YYYY-MM", chunk start, chunk end)
+    :rtype: list
+    """
+    ranges = []
+    month = start.tz_convert("UTC").tz_localize(None).to_period("M")
+    while True:
+        m_start = month.start_time.tz_localize("UTC")
+        if m_start >= end:
+            break
+        m_end = (month + 1).start_time.tz_localize("UTC")
+        ranges.append((str(month), max(start, m_start), min(end, m_end)))
+        month += 1
+    return ranges
+
+
+def _typed_chunk(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """
+    Normalize one exported CSV chunk like eco2mix_df does for the records API:
+    UTC DatetimeIndex named date_heure, numeric columns as float, rows restricted to [start, end).
+    """
+    df["date_heure"] = pd.to_datetime(df["date_heure"], errors="coerce", utc=True)
+    df = df.dropna(subset=["date_heure"])
+    # Filtering client-side too keeps the result correct against a stand-in that ignores the query
+    df = df[(df["date_heure"] >= start) & (df["date_heure"] < end)]
+    for col in df.columns:
+        if col in STRING_COLUMNS:
+            df[col] = df[col].astype("string")
+        elif col != "date_heure":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df.set_index("date_heure").sort_index()
+
+
+def stream_export(
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        url: str = ECO2MIX_EXPORT_URL,
+        chunksize: int = 10_000,
+        vars=None
+        ):
+    """
+    Stream eco2mix records in [start, end) from the dataset bulk CSV export, one DataFrame of at most <chunksize> rows at a time.
+    The HTTP body is consumed incrementally, so memory stays bounded whatever the size of the range.
+
+    :param url: Export endpoint (or a local stand-in serving the same CSV format)
+    :type url: str
+    :param chunksize: Number of rows parsed at once
+    :type chunksize: int
+    :param vars: Columns to select (date_heure is always included). None → all columns.
+    """
+    params = {
+        "where": f"date_heure >= '{start.isoformat()}' AND date_heure < '{end.isoformat()}'",
+        "order_by": "date_heure ASC",
+        "delimiter": ";",
+    }
+    if vars is not None:
+        params["select"] = ",".join(["date_heure"] + list(vars))
+
+    with requests.get(url, params=params, stream=True, timeout=60) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        reader = pd.read_csv(
+            resp.raw, sep=";", chunksize=chunksize, encoding="utf-8-sig",
+            dtype={col: str for col in STRING_COLUMNS},
+        )
+        for chunk in reader:
+            chunk = _typed_chunk(chunk, start, end)
+            if len(chunk) > 0:
+                yield chunk
+
+
+def _archive_last_timestamp(path: Path):
+    if not path.exists():
+        return None
+    index = pq.read_table(path, columns=["date_heure"]).column("date_heure").to_pandas()
+    if len(index) == 0:
+        return None
+    return pd.to_datetime(index.max(), utc=True)
+
+
+def backfill_partition(
+        path: Path,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        url: str = ECO2MIX_EXPORT_URL,
+        chunksize: int = 10_000,
+        ) -> int:
+    """
+    Fill one archive partition with the records in [start, end).
+    Chunks are appended as parquet row groups to a temporary file which replaces the partition once complete:
+    an interrupted run leaves the previous partition untouched and is simply resumed by the next one.
+    If the partition already exists, only the records after its last timestamp are fetched.
+
+    :return: Number of new rows written
+    :rtype: int
+    """
+    last_timestamp = _archive_last_timestamp(path)
+    if last_timestamp is not None:
+        start = max(start, last_timestamp + pd.Timedelta(minutes=15))
+    if start >= end:
+        return 0
+
+    tmp = path.with_name(path.name + ".tmp")
+    writer = None
+    written = 0
+    try:
+        if last_timestamp is not None:
+            existing = pq.read_table(path)
+            writer = pq.ParquetWriter(tmp, existing.schema)
+            writer.write_table(existing)
+
+        for chunk in stream_export(start, end, url=url, chunksize=chunksize):
+            # Export is ordered by date_heure: dropping what is not strictly after
+            # the last written timestamp dedupes across chunks and against the partition
+            if last_timestamp is not None:
+                chunk = chunk[chunk.index > last_timestamp]
+            chunk = chunk[~chunk.index.duplicated(keep="last")]
+            if len(chunk) == 0:
+                continue
+
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=True)
+                writer = pq.ParquetWriter(tmp, table.schema)
+            else:
+                chunk = chunk.reindex(columns=[c for c in writer.schema.names if c != "date_heure"])
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=True)
+            writer.write_table(table)
+
+            written += len(chunk)
+            last_timestamp = chunk.index.max()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if written > 0:
+        tmp.replace(path)
+    else:
+        tmp.unlink(missing_ok=True)
+    return written
+
+
+def backfill_eco2mix(
+        start,
+        end=None,
+        url: str = ECO2MIX_EXPORT_URL,
+        archive_dir: Path = ARCHIVE_DIR,
+        chunksize: int = 10_000,
+        verbose: bool = True
+        ) -> dict:
+    """
+    Bulk historical backfill of eco2mix data through the dataset export endpoint, into monthly parquet partitions
+    (<archive_dir>/YYYY-MM.parquet). Safe to interrupt and re-run: complete partitions are skipped, partial ones resumed.
+
+    :param start: First timestamp to backfill (str or Timestamp, UTC if naive)
+    :param end: End of the range (excluded). None → now.
+    :param url: Export endpoint (or a local stand-in, see serve_stand_in)
+    :type url: str
+    :param archive_dir: Destination of the monthly partitions
+    :type archive_dir: Path
+    :param chunksize: Number of CSV rows held in memory at once
+    :type chunksize: int
+    :param verbose: Logging
+    :type verbose: bool
+    :return: {"rows": rows written, "partitions": partitions touched, "seconds": wall time}
+    :rtype: dict
+    """
+    def log(msg):
+        if verbose:
+            print(msg)
+
+    log("\n[Eco2Mix Backfill]")
+    start = pd.Timestamp(start)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = clock.now().floor("15min") if end is None else pd.Timestamp(end)
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    t0 = time.perf_counter()
+    rows, partitions = 0, 0
+    for label, m_start, m_end in month_ranges(start, end):
+        written = backfill_partition(archive_dir / f"{label}.parquet", m_start, m_end, url=url, chunksize=chunksize)
+        if written > 0:
+            partitions += 1
+            rows += written
+            log(f"{label}: {written} rows written")
+        else:
+            log(f"{label}: already complete")
+
+    stats = {"rows": rows, "partitions": partitions, "seconds": time.perf_counter() - t0}
+    log(f"Backfill completed: {rows} rows in {stats['seconds']:.1f}s")
+    return stats
+
+
+def load_archive(start=None, end=None, archive_dir: Path = ARCHIVE_DIR, columns=None) -> pd.DataFrame:
+    """
+    Load archived eco2mix records in [start, end), reading only the monthly partitions overlapping the range.
+    """
+    if start is not None:
+        start = pd.Timestamp(start)
+        start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    if end is not None:
+        end = pd.Timestamp(end)
+        end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+
+    frames = []
+    for path in sorted(archive_dir.glob("*.parquet")):
+        month = pd.Period(path.stem, freq="M")
+        m_start = month.start_time.tz_localize("UTC")
+        m_end = (month + 1).start_time.tz_localize("UTC")
+        if (end is not None and m_start >= end) or (start is not None and m_end <= start):
+            continue
+        frames.append(pd.read_parquet(path, columns=columns))
+
+    if not frames:
+        return pd.DataFrame().set_index(pd.DatetimeIndex([], name="date_heure", tz="UTC"))
+
+    data = pd.concat(frames).sort_index()
+    if start is not None:
+        data = data[data.index >= start]
+    if end is not None:
+        data = data[data.index < end]
+    return data
+
+
+def merge_into_live(retention_days: int = RETENTION_DAYS, archive_dir: Path = ARCHIVE_DIR, verbose: bool = True) -> int:
+    """
+    Fill the live store (eco2mix.parquet) with archived records of the last <retention_days> days it does not already contain,
+    e.g. after increasing RETENTION_DAYS. Rows already in the live store are kept as they are.
+
+    :return: Number of rows added
+    :rtype: int
+    """
+    eco2mix_file = DATA_DIR / "raw" / "eco2mix.parquet"
+    now = clock.now().floor("15min")
+    archived = load_archive(start=now - pd.Timedelta(days=retention_days), end=now, archive_dir=archive_dir)
+
+    if eco2mix_file.exists():
+        local = pd.read_parquet(eco2mix_file)
+        archived = archived[~archived.index.isin(local.index)]
+        combined = pd.concat([local, archived]).sort_index()
+    else:
+        combined = archived
+
+    if len(archived) > 0:
+        eco2mix_file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_to_parquet(combined, eco2mix_file)
+        # Rows older than the processing watermark were added: derive everything again
+        data_processing.update_processed(rebuild=True, verbose=verbose)
+    if verbose:
+        print(f"Merged {len(archived)} archived rows into {eco2mix_file}")
+    return len(archived)
+
+
+############################################
+# Offline stand-in & benchmark
+############################################
+
+_WHERE_RANGE = re.compile(r"'([^']+)'\s*(?:TO|AND date_heure <)\s*'([^']+)'")
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves a local CSV file (ODRE export format) both as the export endpoint (.../exports/csv)
+    and as the paged records endpoint (.../records), honouring the date_heure range of the `where` clause.
+    """
+    data = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        frame = self.data
+        match = _WHERE_RANGE.search(query.get("where", [""])[0])
+        if match:
+            start = pd.Timestamp(match.group(1)).tz_convert("UTC")
+            end = pd.Timestamp(match.group(2)).tz_convert("UTC")
+            dates = frame["date_heure"]
+            frame = frame[(dates >= start) & (dates < end if "exports" in url.path else dates <= end)]
+
+        if url.path.endswith("/records"):
+            limit = int(query.get("limit", ["100"])[0])
+            page = frame.head(limit).astype(object).where(frame.head(limit).notna(), None)
+            page["date_heure"] = [ts.isoformat() for ts in frame["date_heure"].head(limit)]
+            body = json.dumps({"total_count": len(frame), "results": page.to_dict("records")}).encode()
+            content_type = "application/json"
+        else:
+            out = frame.copy()
+            out["date_heure"] = out["date_heure"].map(pd.Timestamp.isoformat)
+            body = out.to_csv(sep=";", index=False).encode()
+            content_type = "text/csv"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_stand_in(csv_path: Path, port: int = 8765, background: bool = False):
+    """
+    Start a local HTTP stand-in of the ODRE API serving <csv_path>. Base URL: http://127.0.0.1:<port>/
+    (export: <base>exports/csv, records: <base>records).
+
+    :param background: Serve from a daemon thread and return the server instead of blocking
+    """
+    data = pd.read_csv(csv_path, sep=";", encoding="utf-8-sig", dtype={col: str for col in STRING_COLUMNS})
+    data["date_heure"] = pd.to_datetime(data["date_heure"], utc=True)
+    handler = type("StandInHandler", (_StandInHandler,), {"data": data.sort_values("date_heure").reset_index(drop=True)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    server.serve_forever()
+
+
+def compare_with_paged(start, end, export_url: str = ECO2MIX_EXPORT_URL, records_url: str = ECO2MIX_URL, archive_dir: Path = None) -> dict:
+    """
+    Wall time of a backfill of [start, end) through the bulk export vs. the paged records API
+    (100 records per request, as update_eco2mix_data does).
+    """
+    start = pd.Timestamp(start)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = pd.Timestamp(end)
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        bulk = backfill_eco2mix(start, end, url=export_url, archive_dir=archive_dir or Path(tmp), verbose=False)
+
+    t0 = time.perf_counter()
+    pages, rows, page_start = 0, 0, start
+    while page_start < end:
+        page = eco2mix_df(start=page_start, end=end - pd.Timedelta(minutes=15), url=records_url)
+        pages += 1
+        if len(page) == 0:
+            break
+        rows += len(page)
+        page_start = page.index.max() + pd.Timedelta(minutes=15)
+    paged = {"rows": rows, "requests": pages, "seconds": time.perf_counter() - t0}
+
+    print(f"Bulk export : {bulk['rows']} rows in {bulk['seconds']:.2f}s")
+    print(f"Paged API   : {paged['rows']} rows in {paged['seconds']:.2f}s ({paged['requests']} requests)")
+    return {"bulk": bulk, "paged": paged}
+
+
+if __name__ == "__main__":
+    from oven_time.logs import setup_logging
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Bulk historical backfill of eco2mix data")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Backfill a date range into the archive")
+    run.add_argument("--start", required=True)
+    run.add_argument("--end", default=None)
+    run.add_argument("--url", default=ECO2MIX_EXPORT_URL)
+    run.add_argument("--chunksize", type=int, default=10_000)
+    run.add_argument("--merge-live", action="store_true", help="Then fill the live store over RETENTION_DAYS")
+
+    serve = sub.add_parser("serve", help="Serve a local CSV as an offline stand-in of the ODRE API")
+    serve.add_argument("--file", required=True, type=Path)
+    serve.add_argument("--port", type=int, default=8765)
+
+    compare = sub.add_parser("compare", help="Wall time of bulk export vs paged ingestion")
+    compare.add_argument("--start", required=True)
+    compare.add_argument("--end", required=True)
+    compare.add_argument("--file", type=Path, default=None, help="Run offline against a stand-in serving this CSV")
+    compare.add_argument("--port", type=int, default=8765)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        backfill_eco2mix(args.start, args.end, url=args.url, chunksize=args.chunksize)
+        if args.merge_live:
+            merge_into_live()
+    elif args.command == "serve":
+        serve_stand_in(args.file, port=args.port)
+    else:
+        urls = {}
+        if args.file is not None:
+            server = serve_stand_in(args.file, port=args.port, background=True)
+            base = f"http://127.0.0.1:{args.port}/"
+            urls = {"export_url": base + "exports/csv", "records_url": base + "records"}
+        compare_with_paged(pd.Timestamp(args.start, tz="UTC"), pd.Timestamp(args.end, tz="UTC"), **urls)
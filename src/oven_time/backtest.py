@@ -0,0 +1,348 @@
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from oven_time import data_processing
+from oven_time.decision import SCORE_PARAMS, score_from_rates, diagnostic_rates, load_prices
+from oven_time.config import DATA_DIR, HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD, WINDOW_RANGE
+
+# Alerts starting less than FLAP_MINUTES after the previous one ended, or lasting less, count as flapping
+FLAP_MINUTES = 60
+
+
+def load_history(start=None, end=None) -> pd.DataFrame:
+    """
+    Full-resolution history for backtests: backfilled archive (see oven_time.backfill) completed with the live store,
+    derived into the technology groups of the diagnostic.
+    """
+    from oven_time.backfill import load_archive
+
+    raw = load_archive(start=start, end=end)
+    eco2mix_file = DATA_DIR / "raw" / "eco2mix.parquet"
+    if eco2mix_file.exists():
+        live = pd.read_parquet(eco2mix_file)
+        raw = pd.concat([raw, live[~live.index.isin(raw.index)]]).sort_index()
+        if start is not None:
+            raw = raw[raw.index >= start]
+        if end is not None:
+            raw = raw[raw.index < end]
+    return data_processing.derive(raw)
+
+
+def param_grid(**values) -> list:
+    """
+    Cartesian product of parameter values, e.g. param_grid(high_threshold=[90, 100], gas_weight=[0.5, 2/3]).
+    Keys are "high_threshold", "low_threshold" and any key of decision.SCORE_PARAMS; missing keys keep their current value.
+    """
+    unknown = set(values) - set(SCORE_PARAMS) - {"high_threshold", "low_threshold"}
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+    keys = list(values)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(values[k] for k in keys))]
+
+
+def alert_state(above: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Alert on/off at each step, replaying check_score_job: the state follows the threshold comparison
+    and is left unchanged when the score is undefined (NaN).
+    """
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), 0))
+    return above[last_valid] & valid[last_valid]
+
+
+def alert_stats(state: np.ndarray, times: np.ndarray, flap_minutes: int = FLAP_MINUTES) -> dict:
+    """
+    Number of alerts, their durations and flapping statistics from an on/off state series.
+
+    :param times: Timestamps of the steps (int64 nanoseconds)
+    """
+    edges = np.diff(np.concatenate(([0], state.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    n = len(starts)
+    if n == 0:
+        return {"alerts": 0, "hours_mean": 0.0, "hours_median": 0.0, "hours_total": 0.0, "flaps": 0}
+
+    step = np.int64(15 * 60 * 10**9)
+    # An alert ends at the first step back below the threshold (or one step after the data ends)
+    end_times = np.append(times, times[-1] + step)[ends]
+    hours = (end_times - times[starts]) / 3.6e12
+
+    flap = np.int64(flap_minutes * 60 * 10**9)
+    short = (end_times - times[starts]) < flap
+    retrigger = np.zeros(n, dtype=bool)
+    retrigger[1:] = (times[starts[1:]] - end_times[:-1]) < flap
+
+    return {
+        "alerts": n,
+        "hours_mean": float(hours.mean()),
+        "hours_median": float(np.median(hours)),
+        "hours_total": float(hours.sum()),
+        "flaps": int((short | retrigger).sum()),
+    }
+
+
+############################################
+# Process pool
+############################################
+
+_FEATURES = None
+
+
+def _init_worker(features):
+    global _FEATURES
+    _FEATURES = features
+
+
+def evaluate(params: dict, features: dict = None) -> dict:
+    """
+    Replay the alerts of one configuration over the whole history (features built by `build_features`).
+    """
+    f = _FEATURES if features is None else features
+    params = dict(params)
+    high = params.pop("high_threshold", HIGH_SCORE_THRESHOLD)
+    low = params.pop("low_threshold", LOW_SCORE_THRESHOLD)
+
+    score, _, _ = score_from_rates(f["gasCCG_use_rate"], f["storage_use_rate"], f["nuclear_use_rate"], f["GAS_TAC"], **params)
+    valid = ~np.isnan(score)
+
+    result = {"high_threshold": high, "low_threshold": low, **params}
+    for kind, above in (("high", score > high), ("low", score < low)):
+        stats = alert_stats(alert_state(above, valid), f["times"])
+        result.update({f"{kind}_{k}": v for k, v in stats.items()})
+    return result
+
+
+def build_features(data: pd.DataFrame) -> dict:
+    """
+    Rolling cycle positions do not depend on the tuned parameters: they are computed once and shared with the pool.
+    """
+    rates = diagnostic_rates(data)
+    features = {col: rates[col].to_numpy(dtype=float) for col in ["gasCCG_use_rate", "storage_use_rate", "nuclear_use_rate", "GAS_TAC"]}
+    features["times"] = rates.index.asi8
+    return features
+
+
+def run_backtest(grid: list, data: pd.DataFrame = None, processes: int = None, chunksize: int = 16) -> pd.DataFrame:
+    """
+    Backtest alert thresholds and score constants over history, one configuration per grid point, across a process pool.
+
+    Parameters
+    ----------
+    grid : list[dict]
+        Configurations to evaluate (see `param_grid`).
+    data : pd.DataFrame
+        Derived history (see `load_history`). None → whole available history.
+    processes : int
+        Pool size. None → number of CPUs; 1 → run in the current process.
+    chunksize : int
+        Grid points sent to a worker at once.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per configuration: parameters, then for "high" (abundance) and "low" (tension) alerts:
+        count, mean/median/total duration (hours) and number of flapping alerts.
+    """
+    if data is None:
+        data = load_history()
+    features = build_features(data)
+
+    if processes == 1:
+        results = [evaluate(params, features) for params in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(features,)) as pool:
+            results = list(pool.map(evaluate, grid, chunksize=chunksize))
+
+    results = pd.DataFrame(results)
+    weeks = (features["times"][-1] - features["times"][0]) / (7 * 24 * 3.6e12) if len(data) > 1 else np.nan
+    results["high_alerts_per_week"] = results["high_alerts"] / weeks
+    results["low_alerts_per_week"] = results["low_alerts"] / weeks
+    return results
+
+
+############################################
+# Price windows (/q)
+############################################
+
+def otsu_thresholds(windows: np.ndarray, severity: float = 1.0) -> np.ndarray:
+    """
+    `decision.optimal_threshold_otsu` for every row of <windows> (one forward price window per row) at once.
+    Rows with constant prices get NaN.
+    """
+    sorted_ = np.sort(windows, axis=1)
+    m = sorted_.shape[1]
+    csum = np.cumsum(sorted_, axis=1)[:, :-1]
+    total = csum[:, -1:] + sorted_[:, -1:]
+
+    # Splitting after position k <=> threshold sorted_[k] (low group: k+1 values), only between distinct values
+    n_low = np.arange(1, m)
+    mean_low = csum / n_low
+    mean_high = (total - csum) / (m - n_low)
+    p_low = n_low / m
+    score = (p_low ** (1/severity)) * (1 - p_low) * (mean_low - mean_high)**2
+    score = np.where(sorted_[:, :-1] < sorted_[:, 1:], score, -np.inf)
+
+    best = np.argmax(score, axis=1)
+    rows = np.arange(len(sorted_))
+    return np.where(np.isfinite(score[rows, best]), sorted_[rows, best], np.nan)
+
+
+def longest_low_run(windows: np.ndarray, thresholds: np.ndarray):
+    """
+    Offset (in steps) and length of the first longest run of prices <= threshold in every row.
+    """
+    mask = windows <= thresholds[:, None]
+    run = np.zeros(len(windows), dtype=np.int64)
+    best_len = np.zeros(len(windows), dtype=np.int64)
+    best_end = np.zeros(len(windows), dtype=np.int64)
+    for j in range(windows.shape[1]):
+        run = np.where(mask[:, j], run + 1, 0)
+        longer = run > best_len
+        best_len = np.where(longer, run, best_len)
+        best_end = np.where(longer, j, best_end)
+    return best_end - best_len + 1, best_len
+
+
+def evaluate_price_windows(
+    prices: pd.Series = None,
+    methods=("otsu", "arbitrary"),
+    severities=(0.5, 1.0, 1.5, 2.0, 3.0),
+    max_window: pd.Timedelta = pd.Timedelta(hours=WINDOW_RANGE),
+    run_duration: pd.Timedelta = pd.Timedelta(hours=2),
+    relative_low: float = 0.30,
+    absolute_low: float = 10,
+):
+    """
+    Replay `decision.price_window` at every quarter-hour of the price history in one vectorized pass per configuration,
+    and measure the realized savings of starting a <run_duration> long consumption at the recommended window start
+    rather than immediately.
+
+    Prices are evaluated on a 15-minute grid (hourly prices are forward-filled) and only at times where the whole
+    <max_window> horizon is available.
+
+    Parameters
+    ----------
+    prices : pd.Series
+        Day-ahead prices (UTC index). None → local price data.
+    methods : iterable of {"otsu", "arbitrary"}
+    severities : iterable of float
+        Otsu severities (the "arbitrary" method uses `relative_low` / `absolute_low` instead).
+    max_window : pd.Timedelta
+        Forward-looking horizon of the recommendation.
+    run_duration : pd.Timedelta
+        Duration of the consumption used to compute the savings.
+
+    Returns
+    -------
+    (pd.DataFrame, dict[str, pd.DataFrame])
+        Summary per configuration (mean savings in €/MWh, share of recommendations saving money,
+        mean delay and window length in hours), and the recommendation made at each quarter-hour per configuration.
+    """
+    if prices is None:
+        prices = load_prices()
+    prices = prices.sort_index()
+    prices = prices[~prices.index.duplicated(keep="last")].resample("15min").ffill(limit=3)
+
+    step = pd.Timedelta(minutes=15)
+    values = prices.to_numpy(dtype=float)
+    m = int(max_window / step) + 1
+    d = int(run_duration / step)
+    if len(values) < m + d:
+        raise ValueError("Not enough price history for the requested horizon.")
+
+    # One row per as-of time, inclusive horizon [as_of, as_of + max_window] like price_window
+    windows = np.lib.stride_tricks.sliding_window_view(values, m)
+    complete = ~np.isnan(windows).any(axis=1)
+    as_of = np.flatnonzero(complete)
+    windows = windows[complete]
+
+    # Mean over the <d> slots from each start; NaN when the span runs past the data or has a gap (missing prices
+    # would otherwise count as 0 €/MWh)
+    csum = np.concatenate(([0.0], np.nancumsum(values)))
+    gaps = np.concatenate(([0], np.cumsum(np.isnan(values))))
+    def mean_price(start):
+        clipped = np.minimum(start, len(values) - d)
+        ok = (start + d <= len(values)) & (gaps[clipped + d] == gaps[clipped])
+        return np.where(ok, (csum[clipped + d] - csum[clipped]) / d, np.nan)
+    immediate = mean_price(as_of)
+
+    configs = [("arbitrary", None)] if "arbitrary" in methods else []
+    configs = [("otsu", sev) for sev in severities if "otsu" in methods] + configs
+
+    summary, details = [], {}
+    for method, severity in configs:
+        if method == "otsu":
+            thresholds = otsu_thresholds(windows, severity=severity)
+        else:
+            lo, hi = windows.min(axis=1), windows.max(axis=1)
+            thresholds = np.maximum(lo + relative_low * (hi - lo), absolute_low)
+
+        offset, length = longest_low_run(windows, thresholds)
+        found = ~np.isnan(thresholds) & (length > 0)
+        savings = np.where(found, immediate - mean_price(as_of + offset), np.nan)
+
+        label = method if severity is None else f"{method}_{severity:g}"
+        details[label] = pd.DataFrame({
+            "start": prices.index[as_of] + offset * step,
+            "end": prices.index[as_of] + (offset + length) * step,
+            "savings": savings,
+        }, index=prices.index[as_of]).where(pd.Series(found, index=prices.index[as_of]), axis=0)
+        summary.append({
+            "method": method,
+            "severity": severity,
+            "recommendations": int(np.count_nonzero(~np.isnan(savings))),
+            "savings_mean": float(np.nanmean(savings)),
+            "savings_median": float(np.nanmedian(savings)),
+            "share_saving": float(np.nanmean(np.where(np.isnan(savings), np.nan, savings > 0))),
+            "delay_hours_mean": float(np.mean(offset[found])) * 0.25,
+            "window_hours_mean": float(np.mean(length[found])) * 0.25,
+        })
+
+    return pd.DataFrame(summary), details
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtests of the diagnostic alerts and of the /q price windows")
+    parser.add_argument("target", choices=["alerts", "windows"])
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default=None, help="CSV file for the full results")
+    args = parser.parse_args()
+
+    if args.target == "windows":
+        t0 = time.perf_counter()
+        summary, _ = evaluate_price_windows()
+        print(f"Price windows evaluated in {time.perf_counter() - t0:.1f}s")
+        print(summary.to_string())
+        if args.output is not None:
+            summary.to_csv(args.output, index=False)
+        raise SystemExit
+
+    start = None if args.start is None else pd.Timestamp(args.start, tz="UTC")
+    end = None if args.end is None else pd.Timestamp(args.end, tz="UTC")
+    history = load_history(start, end)
+    print(f"History: {len(history)} points from {history.index.min()} to {history.index.max()}")
+
+    # 1,000 configurations around the current values
+    grid = param_grid(
+        high_threshold=[80, 90, 100, 110, 120],
+        low_threshold=[0, 10, 20, 30],
+        gas_weight=[0.5, 0.6, 2/3, 0.75, 0.8],
+        nuclear_bonus_cap=[25, 50],
+        ocgt_malus_divisor=[5, 10, 20, 40, 80],
+    )
+
+    t0 = time.perf_counter()
+    results = run_backtest(grid, data=history, processes=args.processes)
+    print(f"{len(grid)} configurations evaluated in {time.perf_counter() - t0:.1f}s")
+    print(results.sort_values(["high_flaps", "low_flaps"]).head(20).to_string())
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
@@ -1,18 +1,36 @@
+import time
 import logging
 from telegram.ext import ContextTypes
+from telegram.error import Forbidden, BadRequest, RetryAfter
 import asyncio
+import pandas as pd
 
-from oven_time.data_download import should_update_eco2mix, update_eco2mix_data, should_update_prices, update_price_data
+from oven_time import clock
+from oven_time.data_version import watch_version
+from oven_time.admission import AdmissionControl, Overloaded, run_expensive, BUSY_TEXT
+from oven_time.logs import log_event
+from oven_time.alerts import SubscriberStore, HIGH_START, HIGH_END, LOW_START, LOW_END
 from oven_time.interface import get_diagnostic, get_price_window
+from oven_time.window_plan import recommended_window
 from oven_time.decision import diagnostic
-from oven_time.config import HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD, WINDOW_METHOD, OTSU_SEVERITY
+from oven_time.config import (
+    HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD, WINDOW_METHOD, OTSU_SEVERITY, WINDOW_RANGE, VERSION_POLL, TIMEZONE,
+    ALERT_SEND_CONCURRENCY
+)
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
+# Bot démarré avant le premier cycle du worker d'ingestion : pas encore de données publiées
+NOT_READY_TEXT = "⏳ Données pas encore disponibles, réessayez dans quelques minutes."
+
 async def now(update, context):
     """Répond avec le diagnostic actuel."""
-    msg = get_diagnostic()
+    try:
+        msg = get_diagnostic()
+    except FileNotFoundError:
+        await update.message.reply_text(NOT_READY_TEXT)
+        return
     await update.message.reply_text(msg, parse_mode="Markdown")
 
 async def at(update, context):
@@ -27,18 +45,50 @@ async def at(update, context):
     time_str = " ".join(context.args)
 
     try:
-        msg = get_diagnostic(at_time=time_str)
+        # Interprétation de la date (dateparser, jusqu'à quelques secondes) et diagnostic passé : hors de la boucle d'événements
+        msg = await run_expensive(get_diagnostic, at_time=time_str)
+    except Overloaded:
+        await update.message.reply_text(BUSY_TEXT)
+        return
+    except TimeoutError:
+        await update.message.reply_text(
+            "⏳ Date trop longue à interpréter, essayez un format plus simple (ex: /a 15:30, /a hier 9am)"
+        )
+        return
     except ValueError as e:
         await update.message.reply_text(str(e), parse_mode="Markdown")
         return
+    except FileNotFoundError:
+        await update.message.reply_text(NOT_READY_TEXT)
+        return
     except Exception as e:
         await update.message.reply_text(f"Erreur lors du calcul du diagnostic", parse_mode="Markdown")
         return
     await update.message.reply_text(msg, parse_mode="Markdown")
 
+def parse_hours(args, command="/q"):
+    """Horizon de /q et /start_window : [heures], WINDOW_RANGE par défaut."""
+    if not args:
+        return float(WINDOW_RANGE)
+    try:
+        hours = float(args[0].lower().rstrip("h").replace(",", "."))
+    except ValueError:
+        raise ValueError(f"Durée invalide. Exemples : {command}, {command} 6, {command} 24")
+    if len(args) > 1 or not 1 <= hours <= 36:
+        raise ValueError(f"La durée doit être comprise entre 1 et 36 heures (ex : {command} 6)")
+    return hours
+
 async def window(update, context):
-    """Répond avec la meilleure fenêtre à venir."""
-    msg = get_price_window(method=WINDOW_METHOD,severity=OTSU_SEVERITY)
+    """Répond avec la meilleure fenêtre dans les [heures] à venir (lue dans le plan précalculé)."""
+    try:
+        hours = parse_hours(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    try:
+        msg = get_price_window(duration=hours, method=WINDOW_METHOD, severity=OTSU_SEVERITY)
+    except ValueError:
+        msg = f"Pas de fenêtre de prix bas identifiable dans les {hours:g}h à venir."
     await update.message.reply_text(msg, parse_mode="Markdown")
 
 
@@ -46,84 +96,276 @@ async def window(update, context):
 ## AUTOMATIC ALERT MESSAGES
 
 SUBSCRIBERS_KEY = "subscribers"
+SCORE_LOCK_KEY = "score_check_lock"
+SEND_SEMAPHORE_KEY = "send_semaphore"
+
+def get_subscribers(application) -> SubscriberStore:
+    """Store des abonnés (SQLite), ouvert au premier accès."""
+    store = application.bot_data.get(SUBSCRIBERS_KEY)
+    if store is None:
+        store = application.bot_data[SUBSCRIBERS_KEY] = SubscriberStore()
+    return store
+
+ALERT_TEXTS = {
+    HIGH_START: "🍃⚡ ABONDANCE ⚡🍃\nIl y a un surplus d'électricité décarbonée sur le réseau !\n(Score : {score:.0f}, /m for more info)",
+    HIGH_END: "❌ Fin de la période d'abondance ⚡🍃",
+    LOW_START: "🔥🏭 FORTE TENSION 🔥🏭\nL'électricité se fait rare et on a démarré les centrales les plus polluantes !\n(Score : {score:.0f}, /m for more info)",
+    LOW_END: "✅ Fin de la période de forte tension 🔥🏭",
+}
+
+def parse_thresholds(args):
+    """Seuils personnels de /start_auto : [seuil_abondance] [seuil_tension], valeurs globales par défaut."""
+    high, low = HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD
+    try:
+        if len(args) >= 1:
+            high = float(args[0])
+        if len(args) >= 2:
+            low = float(args[1])
+    except ValueError:
+        raise ValueError("Seuils invalides. Exemples : /start_auto, /start_auto 120, /start_auto 120 0")
+    if len(args) > 2 or low >= high:
+        raise ValueError("Seuils invalides : le seuil d'abondance doit être supérieur au seuil de tension (ex : /start_auto 120 0)")
+    return high, low
 
 async def start_auto(update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    subscribers = context.application.bot_data.setdefault(SUBSCRIBERS_KEY, set())
-    subscribers.add(chat_id)
-    print(f"Subscriber to automatic messages added: {chat_id}. (Total={len(subscribers)} active subscribers)")
-    await update.message.reply_text("✅ ACTIF: Alerte automatique en cas d'électricité verte abondante 🍃⚡ ou de forte tension sur le réseau 🔥🏭")
+    try:
+        high, low = parse_thresholds(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    subscribers = get_subscribers(context.application)
+    subscribers.add(chat_id, high=high, low=low)
+    log_event(logger, "subscribe", alert="score", chat_id=chat_id, high=high, low=low)
+    await update.message.reply_text(
+        "✅ ACTIF: Alerte automatique en cas d'électricité verte abondante 🍃⚡ ou de forte tension sur le réseau 🔥🏭\n"
+        f"(Seuils : abondance au-dessus de {high:g}, tension en dessous de {low:g})"
+    )
 
 async def stop_auto(update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    subscribers = context.application.bot_data.setdefault(SUBSCRIBERS_KEY, set())
-    subscribers.discard(chat_id)
-    print("Subscriber to automatic messages removed: {chat_id}. (Total={len(subscribers)} active subscribers)")
+    subscribers = get_subscribers(context.application)
+    subscribers.remove(chat_id)
+    log_event(logger, "unsubscribe", alert="score", chat_id=chat_id)
     await update.message.reply_text("❌ INACTIF: Alerte automatique en cas d'électricité verte abondante 🍃⚡ ou de forte tension sur le réseau 🔥🏭")
 
 
+async def start_window(update, context: ContextTypes.DEFAULT_TYPE):
+    """Active le rappel au début de chaque fenêtre de prix bas recommandée (horizon [heures])."""
+    chat_id = update.effective_chat.id
+    try:
+        hours = parse_hours(context.args or [], command="/start_window")
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    subscribers = get_subscribers(context.application)
+    subscribers.add_window(chat_id, hours)
+    log_event(logger, "subscribe", alert="window", chat_id=chat_id, hours=hours)
+    next_start = schedule_window_reminder(context.application, hours)
+    text = f"⏰ ACTIF: Rappel au début de chaque fenêtre de prix bas (horizon {hours:g}h)"
+    if next_start is not None:
+        text += f"\nProchain rappel à {next_start.tz_convert(TIMEZONE).strftime('%H:%M')}"
+    await update.message.reply_text(text)
+
+async def stop_window(update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    get_subscribers(context.application).remove_window(chat_id)
+    log_event(logger, "unsubscribe", alert="window", chat_id=chat_id)
+    await update.message.reply_text("❌ INACTIF: Rappel au début des fenêtres de prix bas")
 
-async def check_score_job(application):
-    state_high = application.bot_data.setdefault("last_alert_high", False)
-    print(f"Last alert high ? {state_high}")
-    state_low = application.bot_data.setdefault("last_alert_low", False)
-    print(f"Last alert low ? {state_low}")
-
-    diag = diagnostic()
-    score = diag["score"]
-    subscribers = application.bot_data.get(SUBSCRIBERS_KEY, set())
-
-    text=None
-    if score <= HIGH_SCORE_THRESHOLD and state_high:
-        text = "❌ Fin de la période d'abondance ⚡🍃"
-        application.bot_data["last_alert_high"] = False
-    if score >= LOW_SCORE_THRESHOLD and state_low:
-        text = "✅ Fin de la période de forte tension 🔥🏭"
-        application.bot_data["last_alert_low"] = False
-    if score > HIGH_SCORE_THRESHOLD and not state_high:
-        text = f"🍃⚡ ABONDANCE ⚡🍃\nIl y a un surplus d'électricité décarbonée sur le réseau !\n(Score : {score:.0f}, /m for more info)"
-        application.bot_data["last_alert_high"] = True
-    if score < LOW_SCORE_THRESHOLD and not state_low:
-        text = f"🔥🏭 FORTE TENSION 🔥🏭\nL'électricité se fait rare et on a démarré les centrales les plus polluantes !\n(Score : {score:.0f}, /m for more info)"
-        application.bot_data["last_alert_low"] = True
-
-
-    if text is not None:
-        for chat_id in subscribers:
+
+# Commandes du bot (utilisées par run_bot et par le banc de charge oven_time.bot_loadtest)
+COMMANDS = {
+    "m": now,
+    "a": at,
+    "q": window,
+    "start_auto": start_auto,
+    "stop_auto": stop_auto,
+    "start_window": start_window,
+    "stop_window": stop_window,
+}
+
+
+async def send_or_forget(application, subscribers, chat_id, text, job="check_score_job") -> bool:
+    """
+    Envoie <text> à un abonné, et l'oublie si le bot a été bloqué ou le chat supprimé.
+
+    :return: True si le message a été envoyé
+    """
+    try:
+        try:
             await application.bot.send_message(chat_id=chat_id, text=text)
+        except RetryAfter as e:
+            # Limite de débit de Telegram atteinte : on attend le délai demandé et on réessaie une fois
+            await asyncio.sleep(e.retry_after)
+            await application.bot.send_message(chat_id=chat_id, text=text)
+        return True
+    except Forbidden:
+        # Bot bloqué ou retiré du groupe : inutile de continuer à lui écrire
+        subscribers.forget(chat_id)
+        log_event(logger, "unsubscribe", alert="all", chat_id=chat_id, reason="blocked", job=job)
+    except BadRequest as e:
+        if "chat not found" in str(e).lower():
+            subscribers.forget(chat_id)
+            log_event(logger, "unsubscribe", alert="all", chat_id=chat_id, reason="chat_not_found", job=job)
+        else:
+            log_event(logger, "send_failed", level=logging.WARNING, chat_id=chat_id, job=job, error=repr(e))
+    return False
 
 
-async def background_job(application, freq=5):
+async def send_page(application, subscribers, chat_ids, text, job="check_score_job") -> int:
     """
-    Coroutine qui tourne en boucle infinie pour :
-    1. mettre à jour eco2mix
-    2. mettre à jour les prix day-ahead si on est après midi et qu'ils manquent
-    3. lancer check_score_job après chaque update
+    Envoie <text> à une page d'abonnés en parallèle : au plus ALERT_SEND_CONCURRENCY messages en cours,
+    tous envois du bot confondus (alertes de score et rappels de fenêtre).
+
+    :return: Nombre de messages envoyés
     """
-    last_timestamp_eco2mix = None
-    last_timestamp_prices = None
-    while True:
-        if should_update_eco2mix(last_timestamp_eco2mix):
-            try:
-                # --- 1. Update eco2mix ---
-                last_timestamp_eco2mix = update_eco2mix_data(verbose=True)
+    semaphore = application.bot_data.setdefault(SEND_SEMAPHORE_KEY, asyncio.Semaphore(ALERT_SEND_CONCURRENCY))
 
-                # --- 2. Recompute score and triggers alerts ---
-                await check_score_job(application)
+    async def send(chat_id):
+        async with semaphore:
+            return await send_or_forget(application, subscribers, chat_id, text, job=job)
 
-            except Exception as e:
-                print(f"[background_job] Erreur dans la MaJ des données de production : {e!r}")
+    return sum(await asyncio.gather(*(send(chat_id) for chat_id in chat_ids)))
 
-        # --- 3. Update prices if needed ---
-        if should_update_prices(last_timestamp_prices):
-            try:
-                update_price_data(verbose=True)
-            except Exception as e:
-                print(f"[background_job] Erreur dans la MaJ des données de prix: {e!r}")
 
-        await asyncio.sleep(freq * 60)
+async def check_score_job(application):
+    # One fan-out at a time: the score is only saved once a fan-out is complete, a concurrent one would send the same alerts
+    async with application.bot_data.setdefault(SCORE_LOCK_KEY, asyncio.Lock()):
+        t0 = time.perf_counter()
+        subscribers = get_subscribers(application)
+        previous = subscribers.last_score
+
+        diag = diagnostic()
+        score = diag["score"]
+
+        # Only the chats whose thresholds were crossed since the last score are read, page by page
+        sent = {}
+        for kind, chat_ids in subscribers.update(score):
+            text = ALERT_TEXTS[kind].format(score=score)
+            delivered = await send_page(application, subscribers, chat_ids, text)
+            if delivered:
+                sent[kind] = sent.get(kind, 0) + delivered
+
+        log_event(logger, "score_check", source="eco2mix", score=score, previous_score=previous, alerts_sent=sent,
+                  duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+
+
+#############################################
+## LOW-PRICE WINDOW REMINDERS
+
+WINDOW_JOB = "window_reminder_{:g}"
+
+WINDOW_REMINDER_TEXT = (
+    "⏰⚡🌱 C'est le moment ! Prix bas jusqu'à {end}\n"
+    "👉 Lancez les gros consommateurs d'électricité (/stop_window pour ne plus recevoir ce rappel)"
+)
+
+def schedule_window_reminder(application, hours: float, after: pd.Timestamp = None):
+    """
+    (Re)programme dans la JobQueue le rappel des abonnés à l'horizon <hours> : un seul job par horizon,
+    au début de la fenêtre recommandée vue de maintenant (ou de <after>), lue dans le plan précalculé.
+    Une fenêtre déjà rappelée n'est pas rappelée deux fois, même recalculée en cours de route (elle commence alors
+    au quart d'heure courant) ou après un redémarrage : toute fenêtre commençant avant la fin de la dernière fenêtre
+    rappelée (enregistrée dans le store des abonnés) est sautée au profit de la suivante.
+
+    :return: Début de la fenêtre programmée (None si aucune)
+    """
+    job_queue = application.job_queue
+    if job_queue is None:
+        log_event(logger, "job_queue_unavailable", level=logging.WARNING, hint="pip install python-telegram-bot[job-queue]")
+        return None
+    for job in job_queue.get_jobs_by_name(WINDOW_JOB.format(hours)):
+        job.schedule_removal()
+
+    now = clock.now()
+    reminded_end = get_subscribers(application).reminded_until(hours)
+    reminded_end = None if reminded_end is None else pd.Timestamp(reminded_end, unit="s", tz="UTC")
+    try:
+        start, end, _ = recommended_window(hours, as_of=now if after is None else max(after, now))
+        if reminded_end is not None and start < reminded_end:
+            start, end, _ = recommended_window(hours, as_of=reminded_end)
+    except ValueError:
+        # Pas de fenêtre (ou pas de prix) : reprogrammé à l'arrivée des prochains prix
+        return None
+
+    job_queue.run_once(
+        window_reminder_job, when=max(start, now).to_pydatetime(),
+        data={"hours": hours, "start": start, "end": end}, name=WINDOW_JOB.format(hours),
+    )
+    return start
+
+def schedule_window_reminders(application):
+    """Reprogramme les rappels de tous les horizons suivis (au démarrage et à l'arrivée de nouveaux prix)."""
+    for hours in get_subscribers(application).window_horizons():
+        schedule_window_reminder(application, hours)
+
+async def window_reminder_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job de la JobQueue au début d'une fenêtre : prévient les abonnés de l'horizon, puis programme la fenêtre suivante."""
+    application = context.application
+    hours, start, end = context.job.data["hours"], context.job.data["start"], context.job.data["end"]
+    subscribers = get_subscribers(application)
+    # Recorded before sending: a reschedule during the fan-out (/start_window, new prices) must not remind it again
+    subscribers.set_reminded(hours, end.timestamp())
+
+    text = WINDOW_REMINDER_TEXT.format(end=end.tz_convert(TIMEZONE).strftime("%H:%M"))
+    sent = 0
+    for chat_ids in subscribers.window_subscribers(hours):
+        sent += await send_page(application, subscribers, chat_ids, text, job="window_reminder_job")
+    log_event(logger, "window_reminder", source="prices", hours=hours, start=start, end=end, alerts_sent=sent)
+
+    schedule_window_reminder(application, hours, after=end)
 
 
-        
+async def flush_subscribers_job(application, freq=2):
+    """
+    Coroutine qui tourne en boucle infinie : écrit par lots les abonnements/désabonnements
+    reçus par /start_auto et /stop_auto.
+    """
+    while True:
+        await asyncio.sleep(freq)
+        try:
+            get_subscribers(application).flush()
+        except Exception:
+            log_event(logger, "flush_failed", level=logging.ERROR, exc_info=True)
 
 
+async def admission_stats_job(application, every=60):
+    """
+    Coroutine qui tourne en boucle infinie : journalise l'état du contrôle d'admission (oven_time.admission) :
+    profondeur de la file d'attente et requêtes refusées, quand des commandes ont été reçues depuis la dernière fois.
+    """
+    processor = application.update_processor
+    if not isinstance(processor, AdmissionControl):
+        return
+    last = None
+    while True:
+        await asyncio.sleep(every)
+        stats = processor.snapshot(reset_peak=True)
+        received = stats["admitted"] + stats["rate_limited"] + stats["rejected"]
+        if received != last:
+            log_event(logger, "admission", **stats)
+        last = received
+
+
+async def watch_data_job(application, poll=VERSION_POLL):
+    """
+    Coroutine qui tourne en boucle infinie côté bot (lecture seule) :
+    attend les nouvelles versions publiées par le worker d'ingestion (oven_time.worker),
+    lance check_score_job à chaque nouvelle donnée de production et reprogramme les rappels de fenêtre à chaque nouveau prix.
+    """
+    async for version, changed in watch_version(poll):
+        log_event(logger, "data_version", data_version=version["version"], changed=sorted(changed),
+                  versions={source: version["sources"][source]["version"] for source in changed})
+        if "eco2mix" in changed:
+            try:
+                await check_score_job(application)
+            except Exception:
+                log_event(logger, "score_check_failed", level=logging.ERROR, exc_info=True)
+        if "prices" in changed:
+            try:
+                schedule_window_reminders(application)
+            except Exception:
+                log_event(logger, "reminder_scheduling_failed", level=logging.ERROR, exc_info=True)
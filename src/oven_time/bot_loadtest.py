@@ -0,0 +1,455 @@
+"""
+Offline load test of the Telegram bot: the real Application, handlers, subscriber store and alert fan-out
+are driven by synthetic Telegram updates, while a local stand-in answers the Bot API calls.
+
+Runs entirely on a scratch data directory filled with synthetic eco2mix / price data, with fake credentials:
+import this module before any other oven_time module (or run it with `python -m oven_time.bot_loadtest`).
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Scratch data directory and fake credentials, set before oven_time.config is read
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:LOADTEST")
+os.environ.setdefault("ENTSOE_API_KEY", "loadtest")
+os.environ["OVENTIME_DATA_DIR"] = tempfile.mkdtemp(prefix="oventime-loadtest-")
+
+import numpy as np
+import pandas as pd
+import psutil
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.ext import ApplicationBuilder, CommandHandler, TypeHandler
+
+from oven_time.config import DATA_DIR, RETENTION_DAYS, LOG_SAMPLE_RATE
+from oven_time import clock, data_processing, window_plan
+from oven_time.data_download import atomic_to_parquet
+from oven_time.data_version import publish_version
+from oven_time.decision import diagnostic
+from oven_time.admission import AdmissionControl
+from oven_time.logs import setup_logging
+from oven_time.bot_commands import (
+    COMMANDS, ALERT_TEXTS, get_subscribers, check_score_job, flush_subscribers_job, watch_data_job
+)
+
+if DATA_DIR != Path(os.environ["OVENTIME_DATA_DIR"]):
+    raise RuntimeError("oven_time.bot_loadtest must be imported before any other oven_time module")
+
+TOKEN = "123456:LOADTEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "OvenTime", "username": "oventime_loadtest_bot"}
+
+# Share of each command in the generated traffic, and the arguments users send with them
+DEFAULT_MIX = {"m": 0.45, "a": 0.2, "q": 0.25, "start_auto": 0.05, "stop_auto": 0.05}
+COMMAND_ARGS = {
+    "a": ["15:30", "9am", "hier 9h", "hier 21h30", "il y a 2 jours 18h", "lundi 8h", "8h", "demain 12h", "n'importe quoi"],
+    "start_auto": ["", "", "120", "90 20", "80 -10", "10 120"],
+}
+ALERT_PREFIXES = tuple(text.split("{")[0][:12] for text in ALERT_TEXTS.values())
+
+
+############################################
+# Synthetic data
+############################################
+
+ECO2MIX_COLUMNS = [
+    "consommation", "fioul", "charbon", "gaz", "nucleaire", "eolien", "solaire", "hydraulique", "pompage",
+    "bioenergies", "fioul_tac", "fioul_cogen", "fioul_autres", "gaz_tac", "gaz_ccg", "gaz_cogen", "gaz_autres",
+    "hydraulique_fil_eau_eclusee", "hydraulique_lacs", "hydraulique_step_turbinage", "destockage_batterie", "stockage_batterie",
+]
+
+
+def synthetic_eco2mix(index: pd.DatetimeIndex, seed: int = 0) -> pd.DataFrame:
+    """
+    Eco2mix-like quarter-hourly data with a daily cycle on gas, storage and nuclear (no physical meaning,
+    just enough structure for every score component to move).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    day_phase = 2 * np.pi * (index.hour * 60 + index.minute).to_numpy() / 1440
+    daily = np.sin(day_phase)
+    data = pd.DataFrame({col: rng.uniform(0, 1000, n).round() for col in ECO2MIX_COLUMNS}, index=index)
+    data["gaz_ccg"] = (3000 + 2500 * daily + rng.normal(0, 300, n)).clip(0).round()
+    data["gaz_tac"] = np.where(daily > 0.8, 300.0, 0.0)
+    data["nucleaire"] = (45000 - 3000 * np.cos(day_phase)).round()
+    data["hydraulique_lacs"] = (3000 + 2000 * daily).round()
+    data.insert(0, "perimetre", "France")
+    data.insert(1, "nature", "Données temps réel")
+    return data
+
+
+def synthetic_prices(index: pd.DatetimeIndex, seed: int = 0) -> pd.DataFrame:
+    """Day-ahead-like prices with a daily cycle."""
+    rng = np.random.default_rng(seed)
+    phase = 2 * np.pi * (index.hour * 60 + index.minute).to_numpy() / 1440
+    return pd.DataFrame({"price": (60 + 40 * np.sin(phase) + rng.normal(0, 5, len(index))).round(2)}, index=index)
+
+
+def write_synthetic_data(days: int = RETENTION_DAYS, seed: int = 0):
+    """Raw eco2mix data over the last <days> days and day-ahead prices up to the end of tomorrow."""
+    (DATA_DIR / "raw").mkdir(parents=True, exist_ok=True)
+    now = clock.now().floor("15min")
+    index = pd.date_range(now - pd.Timedelta(days=days), now - pd.Timedelta(minutes=15), freq="15min", name="date_heure")
+    atomic_to_parquet(synthetic_eco2mix(index, seed), DATA_DIR / "raw" / "eco2mix.parquet")
+
+    price_index = pd.date_range(now.floor("D") - pd.Timedelta(days=days), now.floor("D") + pd.Timedelta(days=2),
+                                freq="15min", inclusive="left")
+    atomic_to_parquet(synthetic_prices(price_index, seed), DATA_DIR / "raw" / "DAprices.parquet")
+
+
+def ingest_step(rows: int = 1, seed: int = None):
+    """
+    What the ingest worker does on new data: append <rows> quarter-hours, rebuild processed data, publish a version.
+    """
+    path = DATA_DIR / "raw" / "eco2mix.parquet"
+    raw = pd.read_parquet(path)
+    index = pd.date_range(raw.index.max() + pd.Timedelta(minutes=15), periods=rows, freq="15min", name="date_heure")
+    raw = pd.concat([raw, synthetic_eco2mix(index, seed)])
+    atomic_to_parquet(raw, path)
+    data_processing.update_processed()
+    publish_version("eco2mix", raw.index.max())
+
+
+############################################
+# Telegram side
+############################################
+
+class FakeBotAPI(BaseRequest):
+    """
+    Local stand-in for the Telegram Bot API: every call is answered after <latency> seconds.
+    Chats in <blocked> answer 403, like users who blocked the bot.
+    <on_message(chat_id, text)> is called for every message delivered.
+    """
+
+    def __init__(self, latency: float = 0.05, blocked=(), on_message=None):
+        self.latency = latency
+        self.blocked = set(blocked)
+        self.on_message = on_message
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data is not None else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint == "sendMessage":
+            chat_id = int(params["chat_id"])
+            if chat_id in self.blocked:
+                return 403, json.dumps({"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}).encode()
+            self._message_id += 1
+            result = {"message_id": self._message_id, "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER, "text": params.get("text", "")}
+            if self.on_message is not None:
+                self.on_message(chat_id, params.get("text", ""))
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def command_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Telegram update (JSON) of a private message <text> starting with a bot command."""
+    command = text.split(" ", 1)[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+def random_command(rng: random.Random, mix: dict) -> str:
+    command = rng.choices(list(mix), weights=list(mix.values()))[0]
+    args = rng.choice(COMMAND_ARGS.get(command, [""]))
+    return f"/{command} {args}".strip()
+
+
+def _percentiles(values) -> dict:
+    if len(values) == 0:
+        return {"n": 0}
+    values = np.asarray(values) * 1000
+    return {"n": len(values), "p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+
+
+############################################
+# Load test
+############################################
+
+async def load_test(
+        scenario: str = "steady",
+        users: int = 1000,
+        rate: float = 20.0,
+        duration: float = 30.0,
+        subscribed: float = 0.3,
+        mix: dict = None,
+        api_latency: float = 0.05,
+        blocked: float = 0.01,
+        concurrency: int = 64,
+        ingest_every: float = 10.0,
+        reaction: float = 5.0,
+        admission: bool = False,
+        log_sample_rate: float = LOG_SAMPLE_RATE,
+        seed: int = 0,
+        verbose: bool = True
+        ) -> dict:
+    """
+    Replay synthetic traffic against the bot for <duration> seconds and measure it.
+
+    Scenarios:
+        - "steady": open-loop Poisson arrivals of <rate> commands/s from <users> users, drawn from <mix>.
+        - "burst": same background traffic, plus one alert sent to every subscriber at the start,
+          each of them answering with /m within <reaction> seconds (mean) of receiving it.
+    In both, new data is ingested every <ingest_every> seconds in a worker thread and picked up by the
+    bot's own watch_data_job, exactly as in production.
+
+    Latencies are measured from the scheduled arrival of each update (so a blocked event loop shows up as latency,
+    not as less traffic) to the end of its handler, including the simulated Bot API round trip.
+
+    :param users: Size of the user population (chat ids 1..users)
+    :param rate: Background arrival rate (commands per second)
+    :param subscribed: Share of users subscribed to automatic alerts at the start
+    :param mix: Command shares, DEFAULT_MIX by default
+    :param api_latency: Simulated Bot API round trip (in seconds)
+    :param blocked: Share of subscribers who blocked the bot (403 on alerts, purged by check_score_job)
+    :param concurrency: Updates processed concurrently by the Application (ApplicationBuilder.concurrent_updates)
+    :param ingest_every: Time between two simulated ingests (in seconds), 0 to disable
+    :param reaction: Mean reaction time of subscribers to an alert in the "burst" scenario (in seconds)
+    :param admission: Put oven_time.admission.AdmissionControl (<concurrency> workers) in front of the handlers,
+        as run_bot.py does: rejected updates are counted apart from the latencies
+    :param log_sample_rate: Share of the per-command events logged by the admission control (1 to log them all).
+        The bot's logs are written to bot.log in the scratch data directory.
+    :return: Throughput, latency percentiles per command, event loop lag, memory over time, API calls, alert fan-out
+    :rtype: dict
+    """
+    def log(msg):
+        if verbose:
+            print(msg)
+
+    if scenario not in ("steady", "burst"):
+        raise ValueError("scenario must be 'steady' or 'burst'")
+    rng = random.Random(seed)
+    mix = DEFAULT_MIX if mix is None else mix
+    log_file = DATA_DIR / "bot.log"
+    setup_logging(path=log_file)
+
+    write_synthetic_data(seed=seed)
+    data_processing.update_processed()
+    window_plan.update_plan(verbose=False)
+    publish_version("eco2mix", pd.read_parquet(DATA_DIR / "raw" / "eco2mix.parquet").index.max())
+    score = diagnostic()["score"]
+    log(f"Synthetic data in {DATA_DIR} (current score {score:.0f})")
+
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    pending = {}                 # update_id -> (scheduled time, command)
+    latencies = defaultdict(list)
+    alerts = []                  # delivery times of alert messages
+    errors = Counter()
+    next_id = iter(range(1, 10**9))
+    update_tasks = set()
+
+    def on_message(chat_id, text):
+        if text.startswith(ALERT_PREFIXES):
+            alerts.append(loop.time() - t0)
+            if scenario == "burst":
+                # Everyone taps /m right after the alert
+                task = loop.create_task(send(chat_id, "/m", delay=rng.expovariate(1 / reaction)))
+                update_tasks.add(task)
+                task.add_done_callback(update_tasks.discard)
+
+    rejected = Counter()
+
+    def on_reject(update, reason):
+        pending.pop(update.update_id, None)
+        rejected[reason] += 1
+
+    api = FakeBotAPI(latency=api_latency, on_message=on_message)
+    processor = AdmissionControl(workers=concurrency, sample_rate=log_sample_rate, on_reject=on_reject) if admission else concurrency
+    app = (
+        ApplicationBuilder().token(TOKEN)
+        .request(api).get_updates_request(FakeBotAPI(latency=0))
+        .concurrent_updates(processor)
+        .build()
+    )
+    for command, callback in COMMANDS.items():
+        app.add_handler(CommandHandler(command, callback))
+
+    async def done(update, context):
+        scheduled, command = pending.pop(update.update_id)
+        latencies[command].append(loop.time() - scheduled)
+
+    async def on_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    # Runs after the command handler of the update (handler groups are processed in order)
+    app.add_handler(TypeHandler(Update, done), group=1)
+    app.add_error_handler(on_error)
+
+    async def send(chat_id, text, delay=0.0, scheduled=None):
+        if delay:
+            await asyncio.sleep(delay)
+        update_id = next(next_id)
+        pending[update_id] = (loop.time() if scheduled is None else scheduled, text.split(" ", 1)[0])
+        await app.update_queue.put(Update.de_json(command_update(update_id, chat_id, text), app.bot))
+
+    # Subscribers (thresholds as sent through /start_auto), a few of whom blocked the bot.
+    # In the burst scenario, thresholds just below the current score: all of them are alerted at the next check.
+    store = get_subscribers(app)
+    subscriber_ids = rng.sample(range(1, users + 1), int(users * subscribed))
+    for chat_id in subscriber_ids:
+        if scenario == "burst":
+            store.add(chat_id, high=score - 1, low=score - 200)
+        else:
+            store.add(chat_id)
+    store.flush()
+    api.blocked = set(rng.sample(subscriber_ids, int(len(subscriber_ids) * blocked)))
+
+    # Monitors: event loop lag and memory
+    lags, memory = [], []
+    process = psutil.Process()
+
+    async def lag_monitor(tick=0.01):
+        while True:
+            start = loop.time()
+            await asyncio.sleep(tick)
+            lags.append(loop.time() - start - tick)
+
+    async def memory_monitor(every=1.0):
+        while True:
+            memory.append((round(loop.time() - t0, 1), process.memory_info().rss / 2**20))
+            await asyncio.sleep(every)
+
+    async def ingest():
+        step = 0
+        while True:
+            await asyncio.sleep(ingest_every)
+            step += 1
+            start = time.perf_counter()
+            # The worker runs in its own process: only its file writes are shared with the bot
+            await asyncio.to_thread(ingest_step, 1, seed + step)
+            log(f"[{loop.time() - t0:6.1f}s] ingest #{step} published ({time.perf_counter() - start:.2f}s)")
+
+    async def traffic():
+        # Open loop: arrival times are fixed in advance, late sends keep their scheduled time
+        scheduled = loop.time()
+        end = t0 + duration
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled >= end:
+                return
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+            await send(rng.randint(1, users), random_command(rng, mix), scheduled=scheduled)
+
+    await app.initialize()
+    await app.start()
+    monitors = [asyncio.create_task(lag_monitor()), asyncio.create_task(memory_monitor()),
+                app.create_task(watch_data_job(app, poll=1)), app.create_task(flush_subscribers_job(app))]
+    if ingest_every:
+        monitors.append(asyncio.create_task(ingest()))
+
+    t0 = loop.time()
+    if scenario == "burst":
+        # New data published: the alert goes out to every subscriber
+        fanout = asyncio.create_task(check_score_job(app))
+    await traffic()
+    if scenario == "burst":
+        await fanout
+
+    # Drain: reactions still scheduled, then updates still in the queue or being handled
+    while update_tasks:
+        await asyncio.gather(*list(update_tasks))
+    deadline = loop.time() + 60
+    while pending and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = loop.time() - t0
+
+    for task in monitors:
+        task.cancel()
+    await app.stop()
+    await app.shutdown()
+    store.close()
+
+    completed = sum(len(v) for v in latencies.values())
+    all_latencies = [x for v in latencies.values() for x in v]
+    result = {
+        "scenario": scenario,
+        "seconds": elapsed,
+        "updates": completed + len(pending),
+        "completed": completed,
+        "throughput": completed / elapsed,
+        "latency": {"all": _percentiles(all_latencies), **{cmd: _percentiles(v) for cmd, v in sorted(latencies.items())}},
+        "loop_lag": _percentiles(lags),
+        "rss_mb": memory,
+        "api_calls": dict(api.calls),
+        "alerts": {"sent": len(alerts), "first_s": min(alerts, default=None), "last_s": max(alerts, default=None)},
+        "errors": dict(errors),
+        "admission": app.update_processor.snapshot() if admission else None,
+    }
+
+    log(f"\n{scenario}: {completed} updates handled in {elapsed:.1f}s → {result['throughput']:.1f} updates/s "
+        f"({len(pending)} unfinished, errors {dict(errors)})")
+    for cmd, stats in result["latency"].items():
+        if stats["n"]:
+            log(f"  {cmd:<12} n={stats['n']:<6} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+                f"p99 {stats['p99_ms']:8.1f} ms   max {stats['max_ms']:8.1f} ms")
+    lag = result["loop_lag"]
+    log(f"  {'loop lag':<12} n={lag['n']:<6} p50 {lag['p50_ms']:8.1f} ms   p95 {lag['p95_ms']:8.1f} ms   "
+        f"p99 {lag['p99_ms']:8.1f} ms   max {lag['max_ms']:8.1f} ms")
+    log(f"  alerts: {len(alerts)} sent" + (f" between {result['alerts']['first_s']:.1f}s and {result['alerts']['last_s']:.1f}s" if alerts else ""))
+    log(f"  RSS: {memory[0][1]:.0f} MB → {max(m for _, m in memory):.0f} MB peak → {memory[-1][1]:.0f} MB at the end")
+    log(f"  Bot API calls: {dict(api.calls)}")
+    log(f"  bot logs: {log_file}")
+    if admission:
+        stats = result["admission"]
+        log(f"  admission: {stats['admitted']} admitted ({stats['queued']} after queueing, peak queue {stats['peak_queue_depth']}), "
+            f"{stats['rejected']} rejected (busy), {stats['rate_limited']} rate limited; expensive commands: "
+            f"{stats['expensive_rejected']} rejected, {stats['expensive_timed_out']} over budget")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of the OvenTime Telegram bot")
+    parser.add_argument("--scenario", choices=["steady", "burst"], default="steady")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=20.0, help="Background commands per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of traffic")
+    parser.add_argument("--subscribed", type=float, default=0.3, help="Share of users subscribed to alerts")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Simulated Bot API round trip (s)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--ingest-every", type=float, default=10.0, help="Seconds between simulated ingests (0: none)")
+    parser.add_argument("--reaction", type=float, default=5.0, help="Mean reaction time to an alert (s)")
+    parser.add_argument("--admission", action="store_true", help="Admission control in front of the handlers (as run_bot.py)")
+    parser.add_argument("--log-sample-rate", type=float, default=LOG_SAMPLE_RATE, help="Share of per-command events logged")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Write the full result to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(load_test(
+        scenario=args.scenario, users=args.users, rate=args.rate, duration=args.duration, subscribed=args.subscribed,
+        api_latency=args.api_latency, concurrency=args.concurrency, ingest_every=args.ingest_every,
+        reaction=args.reaction, admission=args.admission, log_sample_rate=args.log_sample_rate, seed=args.seed,
+    ))
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
@@ -0,0 +1,53 @@
+import contextlib
+import pandas as pd
+
+# Clock read by the ingest and decision code instead of the system time, so that a replay can drive it
+# (see oven_time.replay). None → system clock.
+_CLOCK = {"now": None}
+
+
+def now() -> pd.Timestamp:
+    """Current time (UTC) according to the installed clock."""
+    clock = _CLOCK["now"]
+    return pd.Timestamp.now(tz="UTC") if clock is None else clock()
+
+
+def set_clock(clock=None):
+    """
+    Install <clock> for every caller of now() in the process.
+
+    :param clock: Function without arguments returning a UTC Timestamp. None → system clock.
+    """
+    _CLOCK["now"] = clock
+
+
+@contextlib.contextmanager
+def use_clock(clock):
+    """Install <clock> for the duration of a with block."""
+    previous = _CLOCK["now"]
+    set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+
+class SimulatedClock:
+    """
+    Clock that only moves when told to (time-travel replay).
+    """
+
+    def __init__(self, start):
+        start = pd.Timestamp(start)
+        self.current = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+
+    def __call__(self) -> pd.Timestamp:
+        return self.current
+
+    def advance(self, delta) -> pd.Timestamp:
+        self.current += pd.Timedelta(delta)
+        return self.current
+
+
+if __name__ == "__main__":
+    print(now())
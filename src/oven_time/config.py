@@ -36,9 +36,36 @@ if _missing:
 TIMEZONE = "Europe/Paris"
 
 ## Data
+DATA_DIR = Path(os.getenv("OVENTIME_DATA_DIR", PROJECT_ROOT / "data")) # Local storage shared by the ingest worker and the bot
 RETENTION_DAYS = 22 # Data to keep in memory
+HISTORY_TIERS = [("1h", 180), ("1D", 5*365), ("7D", None)] # Downsampled history (mean, min, max) after RETENTION_DAYS : (resolution, days kept in the tier, None = no expiry), finest first
 FREQ_UPDATE_ECO2MIX = 20 # Eco2Mix Data : Time elapsed since last data that triggers an update attempt (in minutes).
 MIN_FORESIGHT_PRICES = 12 # Price Data from ENTSO-E : Update attempt triggered if last data less than MIN_FORESIGHT_PRICES in the future
+PRICE_CHUNK_DAYS = 1 # Price Data from ENTSO-E : missing days are requested in chunks of at most PRICE_CHUNK_DAYS market days
+PRICE_FETCH_WORKERS = 4 # Price Data from ENTSO-E : chunks requested in parallel
+PRICE_FETCH_RETRIES = 3 # Price Data from ENTSO-E : attempts per chunk before giving up on it until the next update
+
+## Ingest worker / bot split
+WORKER_FREQ = 5 # Ingest worker : time between two update attempts (in minutes)
+VERSION_POLL = 5 # Bot : time between two checks of the published data version (in seconds)
+
+## Bot admission control
+ADMISSION_WORKERS = 16 # Bot : updates handled concurrently
+ADMISSION_BACKLOG = 200 # Bot : updates waiting for a worker, beyond which new ones get an immediate "busy" reply
+CHAT_RATE = 0.5 # Bot : sustained commands per second and per chat (token bucket refill)
+CHAT_BURST = 5 # Bot : commands a chat can send at once (token bucket size)
+EXPENSIVE_DELAY = 2 # Bot : queued expensive commands (/a) are served as if they had arrived EXPENSIVE_DELAY seconds later
+EXPENSIVE_WORKERS = 2 # Bot : threads running expensive commands (/a) outside the event loop, beyond which they get a "busy" reply
+EXPENSIVE_TIMEOUT = 5 # Bot : time budget of an expensive command (in seconds)
+ALERT_SEND_CONCURRENCY = 30 # Bot : alert messages in flight at once during a fan-out (Telegram accepts ~30 messages per second to different chats)
+
+## Logging
+LOG_LEVEL = "INFO" # Operational logs (JSON lines on stdout, see oven_time.logs) : minimum level
+LOG_SAMPLE_RATE = 0.01 # Share of the per-command events logged (each sampled event carries its sample_rate)
+
+## Local HTTP API
+API_HOST = "127.0.0.1"
+API_PORT = 8080
 
 ## Automatic Updates
 HIGH_SCORE_THRESHOLD = 100 # Score above which an automated "abundance" message is sent
@@ -48,4 +75,5 @@ LOW_SCORE_THRESHOLD = 10 # Score below which an automated "tension" message is s
 WINDOW_METHOD = "otsu"
 OTSU_SEVERITY = 1
 WINDOW_RANGE = 12
+WINDOW_PLAN_DURATIONS = [6, WINDOW_RANGE, 24] # Horizons (in hours) of the window plan precomputed when new prices land (/q, window reminders)
 
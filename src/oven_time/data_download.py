@@ -1,16 +1,42 @@
+import os
+import time
+import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 from entsoe import EntsoePandasClient
+from entsoe.exceptions import NoMatchingDataError
 
-from oven_time.config import PROJECT_ROOT, RETENTION_DAYS, FREQ_UPDATE_ECO2MIX, MIN_FORESIGHT_PRICES, COUNTRY_CODE, ENTSOE_API_KEY
+from oven_time import clock
+from oven_time.logs import log_event
+from oven_time.config import (
+    DATA_DIR, RETENTION_DAYS, HISTORY_TIERS, FREQ_UPDATE_ECO2MIX, MIN_FORESIGHT_PRICES, COUNTRY_CODE, ENTSOE_API_KEY,
+    PRICE_CHUNK_DAYS, PRICE_FETCH_WORKERS, PRICE_FETCH_RETRIES, TIMEZONE
+)
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 ECO2MIX_URL = "https://odre.opendatasoft.com/api/explore/v2.1/catalog/datasets/eco2mix-national-tr/records"
 
+logger = logging.getLogger(__name__)
 
 
 
-def eco2mix_raw(start, end, limit=100, vars=None):
+def atomic_to_parquet(df: pd.DataFrame, path: Path):
+    """
+    Write <df> to <path> through a temporary file so that readers in another process never see a partial file.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+
+def eco2mix_raw(start, end, limit=100, vars=None, url=ECO2MIX_URL):
     where = f"date_heure:['{start}' TO '{end}']"
 
     params = {
@@ -23,47 +49,109 @@ def eco2mix_raw(start, end, limit=100, vars=None):
         select_cols = ["date_heure"] + list(vars)
         params["select"] = ",".join(select_cols)
 
-    resp = requests.get(ECO2MIX_URL, params=params, timeout=10)
+    resp = requests.get(url, params=params, timeout=10)
     resp.raise_for_status()
-    return resp.json()["results"]
+    return json_loads(resp.content)["results"]
 
-def eco2mix_df(start=None, end=None, limit=100, vars=None) -> pd.DataFrame:
-    if end is None:
-        end = pd.Timestamp.now(tz="UTC")
-    if start is None:
-        start = end - timedelta(days=RETENTION_DAYS)
 
-    rows = eco2mix_raw(start=start, end=end, limit=limit, vars=vars)
-
-    if not rows:
-        return pd.DataFrame().set_index(
-            pd.DatetimeIndex([], name="date_heure")
-        )
-
-    df = pd.json_normalize(rows)
+class ColumnBuffer:
+    """
+    Eco2mix records decoded straight into typed column arrays (float64, or object for text columns),
+    growing by doubling across pages. Timestamps are kept as strings and parsed in bulk once, when the
+    DataFrame is built at the end of an update.
+    """
 
-    if "date_heure" not in df.columns:
-        if "fields.date_heure" in df.columns:
-            df["date_heure"] = df["fields.date_heure"]
-        else:
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.n = 0
+        self.columns = {}
+
+    def _new_column(self, dtype):
+        if dtype is object:
+            return np.full(self.capacity, None, dtype=object)
+        return np.full(self.capacity, np.nan)
+
+    def append(self, rows: list) -> int:
+        """
+        Add one page of API records.
+
+        :return: Number of records added
+        :rtype: int
+        """
+        if not rows:
+            return 0
+        if "date_heure" not in rows[0] and "fields" in rows[0]:
+            rows = [row["fields"] for row in rows]
+
+        n = len(rows)
+        if self.n + n > self.capacity:
+            while self.n + n > self.capacity:
+                self.capacity *= 2
+            for name, arr in self.columns.items():
+                grown = self._new_column(object if arr.dtype == object else np.float64)
+                grown[:self.n] = arr[:self.n]
+                self.columns[name] = grown
+
+        for name in rows[0]:
+            values = [row.get(name) for row in rows]
+            if name not in self.columns:
+                first = next((v for v in values if v is not None), None)
+                self.columns[name] = self._new_column(object if name == "date_heure" or isinstance(first, str) else np.float64)
+            arr = self.columns[name]
+            if arr.dtype == object:
+                arr[self.n:self.n + n] = values
+            else:
+                try:
+                    arr[self.n:self.n + n] = np.array(values, dtype=np.float64)
+                except (TypeError, ValueError):
+                    # Unexpected text in a numeric column: keep it as text
+                    arr = arr.astype(object)
+                    arr[self.n:self.n + n] = values
+                    self.columns[name] = arr
+
+        self.n += n
+        return n
+
+    def last_timestamp(self):
+        """Last timestamp added (records are requested in ascending order)."""
+        if self.n == 0:
+            return None
+        return pd.to_datetime(self.columns["date_heure"][self.n - 1], errors="coerce", utc=True)
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.n == 0 or "date_heure" not in self.columns:
             return pd.DataFrame().set_index(
                 pd.DatetimeIndex([], name="date_heure")
             )
 
-    df["date_heure"] = pd.to_datetime(df["date_heure"], errors="coerce", utc=True)
-    df = df.dropna(subset=["date_heure"])
-
-    if df.empty:
-        return pd.DataFrame().set_index(
-            pd.DatetimeIndex([], name="date_heure")
+        index = pd.to_datetime(self.columns["date_heure"][:self.n], errors="coerce", utc=True, format="ISO8601")
+        keep = ~index.isna()
+        df = pd.DataFrame(
+            {name: arr[:self.n][keep] for name, arr in self.columns.items() if name != "date_heure"},
+            index=pd.DatetimeIndex(index[keep], name="date_heure"),
         )
+        if df.empty:
+            return pd.DataFrame().set_index(
+                pd.DatetimeIndex([], name="date_heure")
+            )
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return df
 
-    df = df.set_index("date_heure").sort_index()
 
-    return df
+def eco2mix_df(start=None, end=None, limit=100, vars=None, url=ECO2MIX_URL) -> pd.DataFrame:
+    if end is None:
+        end = clock.now()
+    if start is None:
+        start = end - timedelta(days=RETENTION_DAYS)
+
+    buffer = ColumnBuffer(capacity=limit)
+    buffer.append(eco2mix_raw(start=start, end=end, limit=limit, vars=vars, url=url))
+    return buffer.to_frame()
 
 def update_eco2mix_data(
         retention_days: int = RETENTION_DAYS, 
+        fetch=None,
         verbose: bool = True
         ) -> pd.Timestamp:
     """
@@ -71,6 +159,7 @@ def update_eco2mix_data(
     
     :param retention_days: Period for which data is kept locally (changes prefered in oven_time.config -> RETENTION_DAYS)
     :type retention_days: int
+    :param fetch: Function (start, end) → one page of API records. None → eco2mix_raw.
     :param verbose: Logging
     :type verbose: bool
     :return: Last timestamp without missing data after the update
@@ -78,10 +167,16 @@ def update_eco2mix_data(
     """
     def log(msg):
         if verbose:
-            print(msg)
+            logger.info(msg)
     
-    log("\n[Eco2Mix Data Update]")
-    raw_dir = PROJECT_ROOT / "data" / "raw"
+    log("[Eco2Mix Data Update]")
+    fetch = eco2mix_raw if fetch is None else fetch
+    t0 = time.perf_counter()
+
+    def summary(rows_added, last_timestamp):
+        log_event(logger, "update", source="eco2mix", rows_added=rows_added, last_timestamp=last_timestamp,
+                  duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+    raw_dir = DATA_DIR / "raw"
     raw_dir.mkdir(parents=True, exist_ok=True)
 
     # 1. Load existing data
@@ -102,7 +197,7 @@ def update_eco2mix_data(
         log("Local data - None")
 
     # 2. Determine download window
-    now = pd.Timestamp.now(tz="UTC").floor("15min")
+    now = clock.now().floor("15min")
     if last_timestamp is None:
         start = now - pd.Timedelta(days=retention_days)
     else:
@@ -111,68 +206,181 @@ def update_eco2mix_data(
 
     if start >= now:
         log("Data already up to date. Nothing to download.")
+        summary(0, last_timestamp)
         return(last_timestamp)
 
-    # 3. Download missing data & concatenate
-    combined = None
+    # 3. Download missing data page by page into typed columns, then build a single frame
+    buffer = ColumnBuffer()
     while start < now:
         try:
-            new_data = eco2mix_df(start=start, end=now)
+            rows = fetch(start=start, end=now)
         except Exception as e:
-            log(f"Error fetching eco2mix_df(start={start}, end={now}) : {e!r}")
+            log(f"Error fetching eco2mix records (start={start}, end={now}) : {e!r}")
             break
 
-        if new_data is None or len(new_data) == 0:
+        if not rows:
             log(f"No data for {start} -> {now}, stop downloading.")
             break
 
-        if not isinstance(new_data.index, pd.DatetimeIndex):
+        buffer.append(rows)
+        last_page_timestamp = buffer.last_timestamp()
+        if pd.isna(last_page_timestamp):
             log(f"Index error: not interpretable as date-time.")
             break
-        
-        new_data.index = pd.to_datetime(new_data.index, utc=True)
+
+        log(f"Downloaded {len(rows)} records up to {last_page_timestamp}")
+        start = last_page_timestamp + pd.Timedelta(minutes=15)
+
+    new_data = buffer.to_frame()
+    combined = None
+    if len(new_data) > 0:
         log(f"Downloaded data from {new_data.index.min()} to {new_data.index.max()}")
-        
         if local is not None:
             if new_data.isna().values.all():
                 log("Downloaded data is empty.")
+                combined = local
             else: combined = pd.concat([local, new_data])
         else:
             combined = new_data
 
-        local = combined
-        last_timestamp = combined.index.max()
-        start = last_timestamp + pd.Timedelta(minutes=15)
-
     if combined is None or len(combined) == 0:
         log("No eco2mix data available.")
+        summary(0, None)
         return
 
-    # 5. Remove data older than retention_days
-    limit = now - pd.Timedelta(days=retention_days)
+    # 5. Move data older than retention_days to the downsampled history (cut on the first tier's bucket boundary)
+    limit = (now - pd.Timedelta(days=retention_days)).floor(HISTORY_TIERS[0][0])
     if min(combined.index) < limit:
+        from oven_time.history import compact
+        compact(combined[combined.index < limit], now=now, verbose=verbose)
         combined = combined[combined.index >= limit]
         log(f"Removed data older than: {limit}")
 
     # 6. Save final cleaned dataset
-    combined.to_parquet(eco2mix_file)
+    atomic_to_parquet(combined, eco2mix_file)
     log("Update completed.")
 
     # 7. Return the last timestamp with complete data
     while len(combined) > 0 and combined.iloc[-1].isna().any():
             combined = combined.iloc[:-1]
     last_timestamp = combined.index.max()
+    summary(len(new_data), last_timestamp)
     return(last_timestamp)
 
+# One ENTSO-E client per process: its HTTP session (connection pool) is reused across updates and chunks
+_ENTSOE = {"client": None}
+
+def entsoe_client() -> EntsoePandasClient:
+    """
+    Shared ENTSO-E client over a pooled session sized for PRICE_FETCH_WORKERS parallel requests.
+    Retries are handled per chunk by fetch_price_chunks (the client's own retry waits 10 s per attempt).
+    """
+    if _ENTSOE["client"] is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=PRICE_FETCH_WORKERS)
+        session.mount("https://", adapter)
+        _ENTSOE["client"] = EntsoePandasClient(api_key=ENTSOE_API_KEY, session=session, retry_count=1, timeout=30)
+    return _ENTSOE["client"]
+
+def missing_price_chunks(
+        stored: pd.Series,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        chunk_days: int = PRICE_CHUNK_DAYS,
+        tz: str = TIMEZONE
+        ) -> list:
+    """
+    Ranges of [start, end) to download: market days (in <tz>) not fully covered by <stored> prices,
+    consecutive ones grouped by at most <chunk_days>. Complete days are never requested again.
+
+    :param stored: Local prices (UTC index, NaN for missing values)
+    :type stored: pd.Series
+    :return: [(chunk_start, chunk_end), ...] in UTC
+    :rtype: list
+    """
+    stored = stored.dropna()
+    chunks = []  # [start, end, number of days]
+    for day_start in pd.date_range(start.tz_convert(tz).floor("D"), end.tz_convert(tz), freq="D", inclusive="left"):
+        lo, hi = max(day_start, start), min(day_start + pd.DateOffset(days=1), end)
+        values = stored[(stored.index >= lo) & (stored.index < hi)]
+        if len(values) >= 2:
+            # Complete: every slot of the price grid (hourly or quarter-hourly) from the first one after lo
+            step = values.index.to_series().diff().min()
+            first = lo.tz_convert("UTC").ceil(step)
+            if values.index[0] == first and len(values) >= -(-(hi - first) // step):
+                continue
+        if chunks and chunks[-1][1] == lo and chunks[-1][2] < chunk_days:
+            chunks[-1][1:] = [hi, chunks[-1][2] + 1]
+        else:
+            chunks.append([lo, hi, 1])
+    return [(lo.tz_convert("UTC"), hi.tz_convert("UTC")) for lo, hi, _ in chunks]
+
+def fetch_price_chunks(
+        client,
+        chunks: list,
+        workers: int = PRICE_FETCH_WORKERS,
+        retries: int = PRICE_FETCH_RETRIES,
+        country_code: str = COUNTRY_CODE,
+        verbose: bool = True
+        ) -> tuple:
+    """
+    Download day-ahead prices for every (start, end) chunk in parallel, retrying each chunk on its own.
+    A chunk without published data yet (e.g. tomorrow before the auction) is not retried.
+
+    :return: (downloaded prices as a "price" DataFrame or None, chunks that failed)
+    :rtype: tuple
+    """
+    def log(msg):
+        if verbose:
+            logger.info(msg)
+
+    def fetch(chunk):
+        start, end = chunk
+        for attempt in range(retries):
+            try:
+                series = client.query_day_ahead_prices(country_code, start=start, end=end)
+            except NoMatchingDataError:
+                return None
+            except Exception as e:
+                if attempt == retries - 1:
+                    raise
+                log(f"Chunk {start} → {end}: attempt {attempt + 1} failed ({e!r}), retrying.")
+                time.sleep(2 ** attempt)
+            else:
+                series.index = series.index.tz_convert("UTC")
+                # The client returns the end boundary as well: it belongs to the next chunk
+                return series[(series.index >= start) & (series.index < end)]
+
+    frames, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                series = future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                log(f"Chunk {futures[future][0]} → {futures[future][1]} failed: {e!r}")
+                continue
+            if series is not None and len(series) > 0:
+                frames.append(series)
+
+    if not frames:
+        return None, failed
+    return pd.concat(frames).sort_index().to_frame(name="price"), failed
+
 def update_price_data(
         retention_days: int = RETENTION_DAYS, 
+        client=None,
         verbose: bool = True
         ) -> pd.Timestamp:
     """
-    Update local price data from the ENTSO-E API up to now, cleans up data older than <retention_days> days ago.
+    Update local price data from the ENTSO-E API up to the end of tomorrow, cleans up data older than <retention_days> days ago.
+    Only the market days missing from the local data are requested (see missing_price_chunks), in parallel chunks:
+    a failed chunk is retried at the next update without refetching the others.
     
     :param retention_days: Period for which data is kept locally (changes prefered in oven_time.config -> RETENTION_DAYS)
     :type retention_days: int
+    :param client: ENTSO-E client (object with a query_day_ahead_prices method). None → shared client (entsoe_client).
     :param verbose: Logging
     :type verbose: bool
     :return: Last timestamp without missing data after the update
@@ -180,78 +388,64 @@ def update_price_data(
     """
     def log(msg):
         if verbose:
-            print(msg)
+            logger.info(msg)
 
-    log("\n[Day-Ahead Price Data Update]")
+    log("[Day-Ahead Price Data Update]")
+    t0 = time.perf_counter()
 
-    client = EntsoePandasClient(api_key=ENTSOE_API_KEY)
-    raw_dir = PROJECT_ROOT / "data" / "raw"
+    client = entsoe_client() if client is None else client
+    raw_dir = DATA_DIR / "raw"
     raw_dir.mkdir(parents=True, exist_ok=True)
     price_file = raw_dir / "DAprices.parquet"
 
-    # 1. Load local data as a Series (file may have no header)
+    # 1. Load local data
     if price_file.exists():
-        # header=None ensures we read files without header correctly
         local = pd.read_parquet(price_file)
         # ensure index is timezone-aware UTC
         local.index = pd.to_datetime(local.index, utc=True)
-        last_timestamp = local.index.max()
-        log(f"Local data - Last timestamp: {last_timestamp}")
+        log(f"Local data - Last timestamp: {local.index.max()}")
     else:
-        local = None
-        last_timestamp = None
+        local = pd.DataFrame({"price": pd.Series(dtype=float)}, index=pd.DatetimeIndex([], tz="UTC"))
         log("No existing price file found.")
 
-    # 2. Determine download window
-    now = pd.Timestamp.now(tz="UTC").floor("15min")
-    if last_timestamp is None:
-        start = now - pd.Timedelta(days=retention_days)
-    else:
-        start = last_timestamp + pd.Timedelta(minutes=15)
-    end = now + pd.Timedelta(days=2) # overshoot to include the next day entirely
-    log(f"Attempting to download from {start} to {end}")
+    # 2. Determine the missing ranges, from the retention limit to the end of tomorrow
+    now = clock.now().floor("15min")
+    limit = now - pd.Timedelta(days=retention_days)
+    end = now.tz_convert(TIMEZONE).floor("D") + pd.DateOffset(days=2)
+    chunks = missing_price_chunks(local["price"], limit, end.tz_convert("UTC"))
+    log(f"{len(chunks)} missing chunk(s) between {limit} and {end}")
 
     # 3. Download missing price data
-    try:
-        new_data = client.query_day_ahead_prices(COUNTRY_CODE, start=start, end=end)
-    except Exception as e:
-        log(f"Data already up to date. Nothing to download. {e}")
-        return(last_timestamp)
+    new_data, failed = fetch_price_chunks(client, chunks, verbose=verbose) if chunks else (None, [])
+    if failed:
+        log(f"{len(failed)} chunk(s) failed, will be retried at the next update.")
 
-    new_data = new_data.to_frame(name="price")
-
-    # Some clients return tz-naive timestamps — ensure UTC tz
-    if new_data.index.tz is None: new_data.index = new_data.index.tz_localize("UTC")
-    else: new_data.index = new_data.index.tz_convert("UTC")
-
-    log(f"Downloaded data from {new_data.index.min()} to {new_data.index.max()}")
-
-    # 4. Concatenate   
-    if local is not None:
-        combined = pd.concat([local, new_data])
+    if new_data is None:
+        log("Nothing new to download.")
+        combined = local
     else:
-        combined = new_data
-
-    # remove duplicates keeping the last (new data should override)
-    combined = combined[~combined.index.duplicated(keep="last")]
-
-    # sort index ascending (useful after concat)
-    combined = combined.sort_index()
+        log(f"Downloaded {len(new_data)} prices from {new_data.index.min()} to {new_data.index.max()}")
+        # 4. Concatenate, new data overrides
+        combined = pd.concat([local, new_data])
+        combined = combined[~combined.index.duplicated(keep="last")].sort_index()
 
     # 5. Remove old data but always keep tomorrow
-    limit = now - pd.Timedelta(days=retention_days)
-    if min(combined.index) < limit:
+    if len(combined) > 0 and min(combined.index) < limit:
         combined = combined[combined.index >= limit]
         log(f"Removed data older than: {limit}.")
 
     # 6. Save in a parquet file
-    combined.to_parquet(price_file)
-    log("Update completed.")
+    if new_data is not None or len(combined) < len(local):
+        atomic_to_parquet(combined, price_file)
+        log("Update completed.")
 
     # 7. Return the last timestamp with complete data
     while len(combined) > 0 and combined.iloc[-1].isna().any():
             combined = combined.iloc[:-1]
-    last_timestamp = combined.index.max()
+    last_timestamp = combined.index.max() if len(combined) > 0 else None
+    log_event(logger, "update", source="prices", rows_added=0 if new_data is None else len(new_data),
+              chunks=len(chunks), failed_chunks=len(failed), last_timestamp=last_timestamp,
+              duration_ms=round((time.perf_counter() - t0) * 1000, 1))
     return(last_timestamp)
 
 def should_update_prices(
@@ -269,7 +463,7 @@ def should_update_prices(
     :rtype: bool
     """
     if last_timestamp is None:
-        price_file = PROJECT_ROOT / "data" / "raw" / "DAprices.parquet"
+        price_file = DATA_DIR / "raw" / "DAprices.parquet"
         if not price_file.exists():
             return True
         prices = pd.read_parquet(price_file)
@@ -277,7 +471,7 @@ def should_update_prices(
             return True
         last_timestamp = pd.to_datetime(prices.index[-1], utc=True)
 
-    now = pd.Timestamp.now(tz="UTC")
+    now = clock.now()
     return last_timestamp < (now + pd.Timedelta(hours=min_foresight_prices))
 
 
@@ -296,19 +490,80 @@ def should_update_eco2mix(
     :rtype: bool
     """
     if last_timestamp is None:
-        eco2mix_file = PROJECT_ROOT / "data" / "raw" / "eco2mix.parquet"
+        eco2mix_file = DATA_DIR / "raw" / "eco2mix.parquet"
         if not eco2mix_file.exists():
             return True
         eco2mix = pd.read_parquet(eco2mix_file)
         if len(eco2mix) == 0:
             return True
         last_timestamp = pd.to_datetime(eco2mix.index, utc=True).max()
-    now = pd.Timestamp.now(tz="UTC")
+    now = clock.now()
     return last_timestamp < (now - pd.Timedelta(minutes=freq_update_eco2mix))
 
 
 
+def benchmark_parse(n_records: int = 10_000, page_size: int = 100, repeat: int = 5) -> dict:
+    """
+    CPU time to turn <n_records> eco2mix API records (pages of <page_size>) into the DataFrame of an update:
+    previous path (json + json_normalize + per-page datetime parsing and concat) vs. ColumnBuffer.
+
+    :return: Best CPU time (in seconds) of each path over <repeat> runs
+    :rtype: dict
+    """
+    import json
+
+    rng = np.random.default_rng(0)
+    numeric = ["consommation", "prevision_j1", "prevision_j", "fioul", "charbon", "gaz", "nucleaire", "eolien", "solaire",
+               "hydraulique", "pompage", "bioenergies", "ech_physiques", "taux_co2", "ech_comm_angleterre", "ech_comm_espagne",
+               "ech_comm_italie", "ech_comm_suisse", "ech_comm_allemagne_belgique", "fioul_tac", "fioul_cogen", "fioul_autres",
+               "gaz_tac", "gaz_ccg", "gaz_cogen", "gaz_autres", "eolien_terrestre", "eolien_offshore",
+               "hydraulique_fil_eau_eclusee", "hydraulique_lacs", "hydraulique_step_turbinage", "destockage_batterie",
+               "stockage_batterie"]
+    times = pd.date_range("2025-01-01", periods=n_records, freq="15min", tz="UTC")
+    values = rng.integers(0, 50_000, size=(n_records, len(numeric)))
+    records = [
+        {"perimetre": "France", "nature": "Données temps réel", "date": ts.strftime("%Y-%m-%d"), "heure": ts.strftime("%H:%M"),
+         "date_heure": ts.isoformat(), **dict(zip(numeric, map(int, row)))}
+        for ts, row in zip(times, values)
+    ]
+    pages = [json.dumps({"results": records[i:i + page_size]}).encode() for i in range(0, n_records, page_size)]
+
+    def previous():
+        combined = None
+        for page in pages:
+            df = pd.json_normalize(json.loads(page)["results"])
+            df["date_heure"] = pd.to_datetime(df["date_heure"], errors="coerce", utc=True)
+            df = df.dropna(subset=["date_heure"]).set_index("date_heure").sort_index()
+            df.index = pd.to_datetime(df.index, utc=True)
+            combined = df if combined is None else pd.concat([combined, df])
+        return combined
+
+    def columnar():
+        buffer = ColumnBuffer()
+        for page in pages:
+            buffer.append(json_loads(page)["results"])
+        return buffer.to_frame()
+
+    result = {}
+    for name, parse in (("previous", previous), ("columnar", columnar)):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.process_time()
+            parse()
+            best = min(best, time.process_time() - t0)
+        result[name] = best
+    print(f"Parse CPU time for {n_records} records: previous {result['previous']*1000:.0f} ms, "
+          f"columnar {result['columnar']*1000:.0f} ms (x{result['previous']/result['columnar']:.1f})")
+    return result
+
+
 if __name__ == "__main__":
-    #print(should_update_prices())
-    print(update_eco2mix_data())
-    print(update_price_data())
+    import sys
+    from oven_time.logs import setup_logging
+    setup_logging()
+    if "--bench-parse" in sys.argv:
+        benchmark_parse()
+    else:
+        #print(should_update_prices())
+        print(update_eco2mix_data())
+        print(update_price_data())
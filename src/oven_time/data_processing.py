@@ -1,37 +1,241 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import contextlib
 import pandas as pd
 from pathlib import Path
-from oven_time.config import PROJECT_ROOT
-
-def init_data():
-    # If no recent changes in raw data, reloads last processed data
-    output_path = Path(PROJECT_ROOT / "data/processed/init_data.parquet")
-    input_path = Path(PROJECT_ROOT / "data/raw/eco2mix.parquet")
-    if output_path.exists():
-        out_mtime = output_path.stat().st_mtime
-        if input_path.stat().st_mtime <= out_mtime:
-            return pd.read_parquet(output_path)
-    
-    data = pd.read_parquet(PROJECT_ROOT / "data/raw/eco2mix.parquet")
-    data = data.drop(["perimetre","nature","date","heure"], axis=1)
-    data = data.drop(['ech_physiques','taux_co2', 'ech_comm_angleterre', 'ech_comm_espagne','ech_comm_italie', 'ech_comm_suisse', 'ech_comm_allemagne_belgique'], axis=1)
-
-    data["RENEWABLE"] = data["eolien"] + data["solaire"] + data["hydraulique_fil_eau_eclusee"]
-    data["NUCLEAR"] = data["nucleaire"]
-    data["STORAGE"] = data['hydraulique_lacs'] + data['hydraulique_step_turbinage'] + data['pompage'] + data['destockage_batterie'] + data['stockage_batterie']
-    data["GAS_CCG"] = data['gaz_ccg']
-    data["GAS_TAC"] = data['gaz_tac']
-    data["OTHER"] = data['charbon']+data['gaz_autres']+data['fioul_tac']+data['fioul_autres']+data['gaz_cogen']+data['fioul_cogen']+data["bioenergies"]
-
-    data = data[["RENEWABLE","NUCLEAR","STORAGE","GAS_CCG","GAS_TAC","OTHER"]]
+from oven_time.config import DATA_DIR
+from oven_time.data_download import atomic_to_parquet
+from oven_time.logs import log_event
+
+AGGREGATES = ["RENEWABLE","NUCLEAR","STORAGE","GAS_CCG","GAS_TAC","OTHER"]
+
+RAW_FILE = DATA_DIR / "raw" / "eco2mix.parquet"
+# Processed store: one file per UTC day, so that an update only rewrites the days it touches
+PROCESSED_DIR = DATA_DIR / "processed" / "init_data"
+STATE_FILE = PROCESSED_DIR / "state.json"
+
+logger = logging.getLogger(__name__)
+
+def derive(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate raw eco2mix columns into the technology groups used by the diagnostic,
+    dropping the observations where data is not available.
+    """
+    data = pd.DataFrame(index=raw.index)
+    data["RENEWABLE"] = raw["eolien"] + raw["solaire"] + raw["hydraulique_fil_eau_eclusee"]
+    data["NUCLEAR"] = raw["nucleaire"]
+    data["STORAGE"] = raw['hydraulique_lacs'] + raw['hydraulique_step_turbinage'] + raw['pompage'] + raw['destockage_batterie'] + raw['stockage_batterie']
+    data["GAS_CCG"] = raw['gaz_ccg']
+    data["GAS_TAC"] = raw['gaz_tac']
+    data["OTHER"] = raw['charbon']+raw['gaz_autres']+raw['fioul_tac']+raw['fioul_autres']+raw['gaz_cogen']+raw['fioul_cogen']+raw["bioenergies"]
 
     # drop the observations where data is not available
-    data = data.dropna(how="any")
+    # (float columns whatever the raw dtypes, so that rows derived separately can be stored together)
+    return data.dropna(how="any").astype("float64")
+
+
+############################################
+# Incremental processed store
+############################################
+
+def partition_path(day: pd.Timestamp) -> Path:
+    return PROCESSED_DIR / f"{day:%Y-%m-%d}.parquet"
+
+def read_state() -> dict:
+    """
+    State of the processed store: {"watermark": first raw timestamp still to (re)derive, "partitions": [file names],
+    "start": first raw timestamp kept, "raw_mtime": mtime of the raw file processed last}. None if the store was never built.
+    """
+    try:
+        return json.loads(STATE_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_state(state: dict):
+    tmp = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, STATE_FILE)
+
+def _watermark(raw: pd.DataFrame) -> pd.Timestamp:
+    """
+    First timestamp that may still change in <raw>: start of the trailing rows with missing values,
+    which update_eco2mix_data downloads again, or the next quarter-hour.
+    """
+    complete = ~raw.isna().any(axis=1).to_numpy()
+    n = len(complete)
+    while n > 0 and not complete[n - 1]:
+        n -= 1
+    return raw.index[n] if n < len(raw) else raw.index[-1] + pd.Timedelta(minutes=15)
+
+@contextlib.contextmanager
+def _store_lock():
+    """Exclusive lock on the processed store, held by whichever process (worker, backfill, fallback reader) writes it."""
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    with open(PROCESSED_DIR / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def update_processed(rebuild: bool = False, verbose: bool = False) -> int:
+    """
+    Bring the processed store up to date with the raw eco2mix file, deriving only the rows from the watermark on
+    (rows ingested or downloaded again since the last update) and dropping the rows evicted from the raw file.
+    Only the daily partitions that changed are rewritten, so the cost of an update follows the amount of new data.
+    Concurrent updates are serialized by a lock file in the store.
+
+    :param rebuild: Derive the whole raw file again (e.g. after older rows were merged into it, see backfill.merge_into_live)
+    :type rebuild: bool
+    :param verbose: Logging
+    :type verbose: bool
+    :return: Number of raw rows derived
+    :rtype: int
+    """
+    with _store_lock():
+        return _update_processed(rebuild, verbose)
+
+def _update_processed(rebuild: bool, verbose: bool) -> int:
+    t0 = time.perf_counter()
+    raw_mtime = RAW_FILE.stat().st_mtime
+    state = None if rebuild else read_state()
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+    raw = pd.read_parquet(RAW_FILE)
+    raw_start = raw.index.min()
+    if state is None or state["watermark"] is None:
+        touched_from = None
+        for path in PROCESSED_DIR.glob("*.parquet"):
+            path.unlink()
+        partitions = {}
+    else:
+        touched_from = pd.Timestamp(state["watermark"])
+        raw = raw[raw.index >= touched_from]
+        partitions = {name: None for name in state["partitions"]}
+
+    derived = derive(raw)
+    written = 0
+
+    # 1. Days with new rows: previous rows from the watermark on are replaced by the new derivation
+    for day, rows in derived.groupby(derived.index.floor("D")):
+        path = partition_path(day)
+        if path.name in partitions and touched_from is not None:
+            stored = pd.read_parquet(path)
+            rows = pd.concat([stored[stored.index < touched_from], rows])
+        atomic_to_parquet(rows, path)
+        partitions[path.name] = None
+        written += 1
+
+    # 2. Days from the watermark on without any derived row left (rows downloaded again and now incomplete)
+    if touched_from is not None:
+        for name in list(partitions):
+            day = pd.Timestamp(name.removesuffix(".parquet"), tz="UTC")
+            if day + pd.Timedelta(days=1) > touched_from and day not in derived.index.floor("D"):
+                stored = pd.read_parquet(PROCESSED_DIR / name)
+                kept = stored[stored.index < touched_from]
+                if len(kept) < len(stored):
+                    atomic_to_parquet(kept, PROCESSED_DIR / name)
+                    written += 1
+
+    # 3. Evict what the raw file no longer holds
+    expired = []
+    stored_start = pd.Timestamp(state["start"]) if touched_from is not None and state.get("start") else None
+    for name in sorted(partitions):
+        day = pd.Timestamp(name.removesuffix(".parquet"), tz="UTC")
+        if day + pd.Timedelta(days=1) <= raw_start:
+            expired.append(name)
+        elif touched_from is not None and day < raw_start and (stored_start is None or stored_start < raw_start):
+            stored = pd.read_parquet(PROCESSED_DIR / name)
+            atomic_to_parquet(stored[stored.index >= raw_start], PROCESSED_DIR / name)
+            written += 1
+    for name in expired:
+        del partitions[name]
+
+    state_watermark = str(_watermark(raw)) if len(raw) > 0 else (state or {}).get("watermark")
+    _write_state({
+        "watermark": state_watermark,
+        "partitions": sorted(partitions),
+        "start": str(raw_start),
+        "raw_mtime": raw_mtime,
+    })
+    # Readers switch to the new partition list first, the files of expired days are deleted afterwards
+    for name in expired:
+        (PROCESSED_DIR / name).unlink(missing_ok=True)
+
+    log_event(logger, "update", level=logging.INFO if verbose else logging.DEBUG, source="processed",
+              rows_added=len(derived), rows_derived=len(raw), partitions_written=written, partitions_expired=len(expired),
+              watermark=state_watermark, duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+    return len(raw)
+
+
+def derive_all() -> pd.DataFrame:
+    """Full derivation of the raw file, as the processed store should hold it."""
+    return derive(pd.read_parquet(RAW_FILE))
+
+
+def verify(verbose: bool = True) -> bool:
+    """
+    Check that the incremental processed store holds exactly what a full rebuild from the raw file gives.
+    """
+    update_processed(verbose=verbose)
+    expected = derive_all()
+    actual = init_data()
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_freq=False)
+    except AssertionError as e:
+        if verbose:
+            print(f"Processed store differs from a full rebuild:\n{e}")
+        return False
+    if verbose:
+        print(f"Processed store matches a full rebuild ({len(actual)} rows).")
+    return True
+
+
+# Last processed data read from disk, shared by every caller of the process until the store changes.
+# Partitions are cached one by one: after an update, only the days rewritten by the worker are read again.
+_CACHE = {"mtime": None, "data": None, "partitions": {}}  # partitions: name -> (mtime, frame)
+
+def init_data(catch_up: bool = False):
+    """
+    Processed data as last published by the ingest worker (read-only).
 
-    processed_dir = PROJECT_ROOT / "data" / "processed"
-    processed_dir.mkdir(parents=True, exist_ok=True)
-    data.to_parquet(PROJECT_ROOT / "data/processed/init_data.parquet")
+    :param catch_up: Without an ingest worker running (CLI, offline tools): process the new raw rows first
+    :type catch_up: bool
+    """
+    if catch_up:
+        state = read_state()
+        if state is None or RAW_FILE.stat().st_mtime > state["raw_mtime"]:
+            update_processed()
+    elif not STATE_FILE.exists():
+        raise FileNotFoundError(f"{STATE_FILE}: no processed data published yet (is the ingest worker running?)")
 
-    return(data)
+    state_mtime = STATE_FILE.stat().st_mtime
+    if _CACHE["mtime"] != state_mtime:
+        state = read_state()
+        partitions = {}
+        try:
+            for name in state["partitions"]:
+                path = PROCESSED_DIR / name
+                mtime = path.stat().st_mtime
+                cached = _CACHE["partitions"].get(name)
+                partitions[name] = cached if cached is not None and cached[0] == mtime else (mtime, pd.read_parquet(path))
+        except FileNotFoundError:
+            # Expired partition deleted by the worker in the meantime: the new state is already written
+            time.sleep(0.05)
+            return init_data(catch_up)
+        frames = [frame for _, frame in partitions.values()]
+        _CACHE["data"] = pd.concat(frames) if frames else pd.DataFrame(columns=AGGREGATES)
+        _CACHE["partitions"] = partitions
+        _CACHE["mtime"] = state_mtime
+    return _CACHE["data"]
 
 if __name__ == "__main__":
-    print(init_data())
+    import sys
+    from oven_time.logs import setup_logging
+    setup_logging()
+    if "--verify" in sys.argv:
+        sys.exit(0 if verify() else 1)
+    print(init_data(catch_up=True))
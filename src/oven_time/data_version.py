@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import asyncio
+
+from oven_time.config import DATA_DIR, VERSION_POLL
+
+VERSION_FILE = DATA_DIR / "version.json"
+
+
+def read_version() -> dict:
+    """
+    Read the data version last published by the ingest worker.
+
+    :return: {"version": global counter, "published_at": epoch seconds, "sources": {source: {"version", "last_timestamp", "published_at"}}}
+    :rtype: dict
+    """
+    try:
+        return json.loads(VERSION_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"version": 0, "published_at": None, "sources": {}}
+
+
+def publish_version(source: str, last_timestamp=None) -> dict:
+    """
+    Notify readers (bot process) that new data from <source> has been written to disk.
+    The version file is replaced atomically, the ingest worker being its only writer.
+
+    :param source: Name of the updated dataset ("eco2mix", "prices", ...)
+    :type source: str
+    :param last_timestamp: Last complete timestamp of the dataset after the update
+    :type last_timestamp: pd.Timestamp
+    :return: The new version
+    :rtype: dict
+    """
+    version = read_version()
+    published_at = time.time()
+    previous = version["sources"].get(source, {"version": 0})
+
+    version["version"] += 1
+    version["published_at"] = published_at
+    version["sources"][source] = {
+        "version": previous["version"] + 1,
+        "last_timestamp": None if last_timestamp is None else str(last_timestamp),
+        "published_at": published_at,
+    }
+
+    VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = VERSION_FILE.with_name(VERSION_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(version))
+    os.replace(tmp, VERSION_FILE)
+    return version
+
+
+async def watch_version(poll: float = VERSION_POLL):
+    """
+    Async generator yielding (version, changed_sources) each time the ingest worker publishes new data.
+    Only the mtime of the version file is checked between two publications, so polling is cheap.
+    The first iteration yields the current version with all its sources marked as changed.
+
+    :param poll: Time between two checks (in seconds)
+    :type poll: float
+    """
+    last_mtime = None
+    known = {}
+    while True:
+        try:
+            mtime = VERSION_FILE.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            version = read_version()
+            changed = {
+                source for source, meta in version["sources"].items()
+                if known.get(source) != meta["version"]
+            }
+            known = {source: meta["version"] for source, meta in version["sources"].items()}
+            if changed:
+                yield version, changed
+
+        await asyncio.sleep(poll)
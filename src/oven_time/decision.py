@@ -1,5 +1,5 @@
-from oven_time import data_processing
-from oven_time.config import PROJECT_ROOT, WINDOW_RANGE, RETENTION_DAYS, TIMEZONE
+from oven_time import clock, data_processing
+from oven_time.config import DATA_DIR, WINDOW_RANGE, RETENTION_DAYS, TIMEZONE
 
 import pandas as pd
 import numpy as np
@@ -155,6 +155,115 @@ def get_cycle_whereat(
 
     return result[tec[0]] if single else result
 
+# Hand-tuned constants of the diagnostic score (see score_from_rates, tuned with oven_time.backtest)
+SCORE_PARAMS = {
+    "gas_weight": 2/3,            # Weight of CCG gas use in the initial score
+    "storage_weight": 1/3,        # Weight of hydro/storage use in the initial score
+    "nuclear_gas_max": 0.1,       # Nuclear bonus only when CCG gas use rate is at most this
+    "nuclear_use_max": 0.995,     # ... and nuclear use rate is at most this
+    "nuclear_bonus_factor": 1000, # Bonus points per unit of unused nuclear availability
+    "nuclear_bonus_cap": 50,      # Maximum bonus
+    "ocgt_gas_min": 0.3,          # OCGT malus only when CCG gas use rate is at least this
+    "ocgt_malus_divisor": 10,     # MW of OCGT generation per malus point
+    "ocgt_malus_cap": 50,         # Maximum malus
+}
+
+
+def score_from_rates(gasCCG_use_rate, storage_use_rate, nuclear_use_rate, gas_tac, **params):
+    """
+    Diagnostic score from the cycle positions of gas, storage and nuclear.
+    Works on scalars as well as on numpy arrays / Series (vectorized backtests).
+
+    Parameters
+    ----------
+    gasCCG_use_rate, storage_use_rate, nuclear_use_rate : float or array
+        "zero_to_max" positions (see `cycle_whereat`).
+    gas_tac : float or array
+        OCGT generation (MW).
+    **params
+        Overrides of `SCORE_PARAMS`.
+
+    Returns
+    -------
+    (score, nuclear_bonus, ocgt_malus)
+    """
+    p = {**SCORE_PARAMS, **params}
+    gas = np.asarray(gasCCG_use_rate, dtype=float)
+    nuclear = np.asarray(nuclear_use_rate, dtype=float)
+
+    # Initial score between 0 and 100 (looser system = higher score)
+    score = 100*(p["gas_weight"]*(1 - gas) + p["storage_weight"]*(1 - np.asarray(storage_use_rate, dtype=float)))
+
+    # Bonus points when nuclear cycling down (up to 50)
+    nuclear_bonus = np.where(
+        (gas <= p["nuclear_gas_max"]) & (nuclear <= p["nuclear_use_max"]),
+        np.minimum(p["nuclear_bonus_cap"], (1 - nuclear) * p["nuclear_bonus_factor"]),
+        0.0,
+    )
+
+    # Malus points when OCGT plants are on (typically up to 500 MW, i.e. 50 points)
+    ocgt_malus = np.where(
+        gas >= p["ocgt_gas_min"],
+        np.maximum(-p["ocgt_malus_cap"], -np.asarray(gas_tac, dtype=float)/p["ocgt_malus_divisor"]),
+        0.0,
+    )
+
+    return score + nuclear_bonus + ocgt_malus, nuclear_bonus, ocgt_malus
+
+
+def rolling_whereat(series: pd.Series, window: int, mode: str = "min_to_max") -> pd.Series:
+    """
+    Vectorized `cycle_whereat` for every timestamp of `series` at once
+    (NaN where the backward-looking window is incomplete or the index is undefined).
+    """
+    roll = series.rolling(window, min_periods=window)
+    mx = roll.max()
+
+    if mode == "min_to_max":
+        mn = roll.min()
+        result = (series - mn) / (mx - mn)
+        return result.where(mx != mn)
+    elif mode == "zero_to_max":
+        return (series / mx).where(mx != 0)
+    else:
+        raise ValueError("mode must be 'min_to_max' or 'zero_to_max'")
+
+
+def diagnostic_rates(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cycle positions used by `diagnostic`, for every timestamp of `data` (output of data_processing.derive).
+    """
+    return pd.DataFrame({
+        "gasCCG_use_rate": rolling_whereat(data["GAS_CCG"], 7*24*4, "zero_to_max"),
+        "storage_phase": rolling_whereat(data["STORAGE"], 7*24*4, "min_to_max"),
+        "storage_use_rate": rolling_whereat(data["STORAGE"], 7*24*4, "zero_to_max"),
+        "nuclear_use_rate": rolling_whereat(data["NUCLEAR"], 6*4, "zero_to_max"),
+        "GAS_TAC": data["GAS_TAC"],
+    }, index=data.index)
+
+
+def diagnostic_series(data: pd.DataFrame = None, start=None, end=None, **params) -> pd.DataFrame:
+    """
+    Vectorized `diagnostic` over [start, end] (whole data if None): one row per timestamp with the score and its components.
+    """
+    if data is None:
+        data = data_processing.init_data()
+    rates = diagnostic_rates(data)
+    if start is not None:
+        rates = rates[rates.index >= start]
+    if end is not None:
+        rates = rates[rates.index <= end]
+
+    score, nuclear_bonus, ocgt_malus = score_from_rates(
+        rates["gasCCG_use_rate"], rates["storage_use_rate"], rates["nuclear_use_rate"], rates["GAS_TAC"], **params
+    )
+    rates = rates.drop(columns="GAS_TAC")
+    rates.insert(0, "score", score)
+    rates.insert(1, "nuclear_bonus", nuclear_bonus)
+    rates.insert(2, "ocgt_malus", ocgt_malus)
+    return rates
+
+
 def diagnostic(target_time: pd.Timestamp = None):
     """
     Provide a global qualitative + quantitative diagnostic of power system tightness,
@@ -213,27 +322,13 @@ def diagnostic(target_time: pd.Timestamp = None):
     )["NUCLEAR"]
 
     # ------------------------------------------------------------
-    # Compute initial score between 0 and 100 (looser system = higher score)
-    # ------------------------------------------------------------
-    score = 100*((2/3)*(1 - gasCCG_use_rate) + (1/3)*(1 - storage_use_rate))
-
-    # ------------------------------------------------------------
-    # Bonus points when nuclear cycling down (up to 50)
-    # ------------------------------------------------------------
-    nuclear_bonus=0
-    if gasCCG_use_rate <= 0.1 and nuclear_use_rate <= 0.995:
-            nuclear_bonus = min(50,(1 - nuclear_use_rate) * 1000)
-            score += nuclear_bonus
-
-
-    # ------------------------------------------------------------
-    # Malus points when OCGT plants are on (typically up to 500 MW, i.e. 50 points)
+    # Score (higher = looser system), see score_from_rates
     # ------------------------------------------------------------
-    ocgt_malus=0
-    if gasCCG_use_rate >= 0.3:
-            ocgt_malus = max(-50,-data.loc[target_time, "GAS_TAC"]/10)
-            score += ocgt_malus
-
+    score, nuclear_bonus, ocgt_malus = (
+        float(x) for x in score_from_rates(
+            gasCCG_use_rate, storage_use_rate, nuclear_use_rate, data.loc[target_time, "GAS_TAC"]
+        )
+    )
 
     # Return full diagnostic bundle
     return {
@@ -306,12 +401,27 @@ def optimal_threshold_otsu(prices, severity=1.0):
 
     return best_tau
 
+_PRICES = {"mtime": None, "prices": None}
+
+def load_prices() -> pd.Series:
+    """
+    Day-ahead prices from local data, kept in memory until the file is rewritten by the ingest worker.
+    """
+    path = DATA_DIR / "raw" / "DAprices.parquet"
+    mtime = path.stat().st_mtime_ns
+    if _PRICES["mtime"] != mtime:
+        _PRICES["prices"] = pd.read_parquet(path)["price"]
+        _PRICES["mtime"] = mtime
+    return _PRICES["prices"]
+
 def price_window(
     max_window=pd.Timedelta(hours=WINDOW_RANGE),
     method: str = "otsu",
     severity: float = 1.0,
     relative_low: float = 0.30,
-    absolute_low: float = 10
+    absolute_low: float = 10,
+    as_of: pd.Timestamp = None,
+    prices: pd.Series = None
 ):
     """
     Identify the longest contiguous low-price time window
@@ -327,6 +437,10 @@ def price_window(
         Relative threshold position (only used if method="arbitrary").
     absolute_low : float
         Absolute minimum price threshold (only used if method="arbitrary").
+    as_of : pd.Timestamp
+        Time at which the recommendation is made. None → now.
+    prices : pd.Series
+        Day-ahead prices (UTC index). None → local price data (see `load_prices`).
 
     Returns
     -------
@@ -342,9 +456,10 @@ def price_window(
     # ------------------------------------------------------------------
     # 1. Load and truncate price data
     # ------------------------------------------------------------------
-    prices = pd.read_parquet(PROJECT_ROOT / "data/raw/DAprices.parquet")["price"]
+    if prices is None:
+        prices = load_prices()
 
-    now = pd.Timestamp.now(tz="UTC").floor("15min")
+    now = (clock.now() if as_of is None else as_of).floor("15min")
     limit = now + max_window
 
     prices = prices.loc[(prices.index >= now) & (prices.index <= limit)]
@@ -0,0 +1,166 @@
+import logging
+import pandas as pd
+from pathlib import Path
+
+from oven_time import clock
+from oven_time.config import DATA_DIR, HISTORY_TIERS
+from oven_time.data_download import atomic_to_parquet
+
+HISTORY_DIR = DATA_DIR / "history"
+STATS = ["mean", "min", "max"]
+
+logger = logging.getLogger(__name__)
+
+
+def tier_path(freq: str) -> Path:
+    return HISTORY_DIR / f"eco2mix_{freq}.parquet"
+
+
+def aggregate(data: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """
+    Downsample <data> to <freq> buckets with mean, min and max of every numeric column (columns "<col>_mean", "<col>_min", "<col>_max").
+    Already aggregated data (output of a finer tier) is combined stat by stat: mean of means, min of mins, max of maxes.
+    Buckets are aligned on the epoch (not on the first row), so that successive batches fill the same buckets.
+    """
+    numeric = data.select_dtypes("number")
+    if all(col.rsplit("_", 1)[-1] in STATS for col in numeric.columns):
+        agg = pd.concat(
+            [numeric[[c for c in numeric.columns if c.endswith("_" + stat)]].resample(freq, origin="epoch").agg(stat)
+             for stat in STATS],
+            axis=1,
+        )
+    else:
+        agg = numeric.resample(freq, origin="epoch").agg(STATS)
+        agg.columns = [f"{col}_{stat}" for col, stat in agg.columns]
+
+    # Empty buckets (gaps in the data) are not stored
+    return agg.dropna(how="all")
+
+
+def compact(expired: pd.DataFrame, now: pd.Timestamp = None, verbose: bool = True):
+    """
+    Move rows evicted from a resolution level into the next, coarser history tier (HISTORY_TIERS),
+    cascading down to the coarsest tier, which is kept without expiry: storage grows with the logarithm of the age
+    of the data, only the coarsest resolution is kept for the oldest data.
+    Called by update_eco2mix_data with the full-resolution rows falling out of RETENTION_DAYS, so each ingest
+    only aggregates what just expired. Existing buckets are never overwritten.
+
+    :param expired: Rows evicted from the previous level (raw eco2mix rows for the first tier)
+    :type expired: pd.DataFrame
+    :param now: Reference time for tier retention. None → now.
+    :type now: pd.Timestamp
+    :param verbose: Logging
+    :type verbose: bool
+    """
+    def log(msg):
+        if verbose:
+            logger.info(msg)
+
+    if now is None:
+        now = clock.now()
+    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+
+    for i, (freq, days) in enumerate(HISTORY_TIERS):
+        if expired is None or len(expired) == 0:
+            break
+
+        path = tier_path(freq)
+        new = aggregate(expired, freq)
+        if path.exists():
+            stored = pd.read_parquet(path)
+            new = new[~new.index.isin(stored.index)]
+            combined = pd.concat([stored, new]).sort_index()
+        else:
+            combined = new
+
+        if days is None:
+            # Last tier: nothing expires
+            expired = None
+        else:
+            # Evict at the boundary of the next tier's buckets so that they are only built from complete data
+            next_freq = HISTORY_TIERS[i + 1][0] if i + 1 < len(HISTORY_TIERS) else freq
+            limit = (now - pd.Timedelta(days=days)).floor(next_freq)
+            expired = combined[combined.index < limit]
+            combined = combined[combined.index >= limit]
+
+        atomic_to_parquet(combined, path)
+        log(f"History {freq}: {len(new)} buckets added, {0 if expired is None else len(expired)} moved to the next tier "
+            f"({len(combined)} kept)")
+
+
+def seed_from_archive(retention_days: int = None, verbose: bool = True):
+    """
+    Build the history tiers from the backfilled archive (see oven_time.backfill), one monthly partition at a time.
+    """
+    from oven_time.backfill import ARCHIVE_DIR
+    from oven_time.config import RETENTION_DAYS
+
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    now = clock.now()
+    limit = (now - pd.Timedelta(days=retention_days)).floor(HISTORY_TIERS[0][0])
+
+    for path in sorted(ARCHIVE_DIR.glob("*.parquet")):
+        month = pd.read_parquet(path)
+        month = month[month.index < limit]
+        if len(month) > 0:
+            compact(month, now=now, verbose=verbose)
+
+
+def query(start, end=None, columns=None, stat: str = "mean") -> pd.DataFrame:
+    """
+    Eco2mix data over [start, end) at the finest resolution available for each part of the range:
+    full resolution within RETENTION_DAYS, then each HISTORY_TIERS level.
+    Values of aggregated tiers are the requested <stat> of each bucket; df.attrs["tiers"] lists the tiers used.
+
+    :param start: Start of the range (str or Timestamp, UTC if naive)
+    :param end: End of the range (excluded). None → now.
+    :param columns: Raw eco2mix columns to return. None → all numeric columns.
+    :param stat: Bucket statistic for aggregated tiers ("mean", "min" or "max")
+    :type stat: str
+    :rtype: pd.DataFrame
+    """
+    if stat not in STATS:
+        raise ValueError(f"stat must be one of {STATS}")
+    start = pd.Timestamp(start)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = clock.now() if end is None else pd.Timestamp(end)
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+
+    levels = [("15min", DATA_DIR / "raw" / "eco2mix.parquet")] + [(freq, tier_path(freq)) for freq, _ in HISTORY_TIERS]
+
+    pieces, tiers = [], []
+    covered_from = end
+    for freq, path in levels:
+        if covered_from <= start:
+            break
+        if not path.exists():
+            continue
+
+        frame = pd.read_parquet(path)
+        if freq == "15min":
+            frame = frame.select_dtypes("number")
+            if columns is not None:
+                frame = frame[list(columns)]
+        else:
+            suffix = "_" + stat
+            selected = [c for c in frame.columns if c.endswith(suffix) and (columns is None or c[:-len(suffix)] in columns)]
+            frame = frame[selected].rename(columns=lambda c: c[:-len(suffix)])
+
+        if len(frame) == 0:
+            continue
+        part = frame[(frame.index >= start) & (frame.index < covered_from)]
+        if len(part) > 0:
+            pieces.append(part)
+            tiers.append(freq)
+        covered_from = min(covered_from, frame.index.min())
+
+    if not pieces:
+        return pd.DataFrame().set_index(pd.DatetimeIndex([], name="date_heure", tz="UTC"))
+
+    data = pd.concat(pieces).sort_index()
+    data.attrs["tiers"] = tiers
+    return data
+
+
+if __name__ == "__main__":
+    print(query(clock.now() - pd.Timedelta(days=365)))
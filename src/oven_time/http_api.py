@@ -0,0 +1,368 @@
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+import pandas as pd
+
+from oven_time import decision, data_processing
+from oven_time.interface import time_interpreter, concl_from_score
+from oven_time.data_version import read_version, watch_version
+from oven_time.window_plan import recommended_window
+from oven_time.config import API_HOST, API_PORT, WINDOW_RANGE, WINDOW_METHOD, OTSU_SEVERITY
+
+try:
+    from orjson import dumps as json_dumps
+except ImportError:
+    import json
+    def json_dumps(obj):
+        return json.dumps(obj).encode()
+
+# Data version as last published by the ingest worker, kept up to date by watch_version
+VERSION = {"current": read_version()}
+CACHE_SIZE = 1024
+
+_cache = OrderedDict()  # (path, resolved query items) -> (etag, last_modified, body)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_time(value: str):
+    """ISO 8601 (local time if naive) or anything the bot's /a command accepts."""
+    if value is None:
+        return None
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    return time_interpreter(value)
+
+
+def _is_relative(value: str) -> bool:
+    """Time whose meaning changes with the current time ("hier 9h", "15:30"), as opposed to ISO 8601."""
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return True
+    return False
+
+
+def resolve_times(query: dict, params) -> dict:
+    """
+    Copy of <query> with its time parameters <params> resolved to absolute UTC timestamps (ISO 8601), so that
+    responses are cached and validated on the time a relative value points to now, not on its text.
+    """
+    resolved = dict(query)
+    for name in params:
+        if resolved.get(name) is not None:
+            resolved[name] = _parse_time(resolved[name]).isoformat()
+    return resolved
+
+
+def _json_value(x):
+    if isinstance(x, pd.Timestamp):
+        return x.isoformat()
+    if isinstance(x, (float, np.floating)):
+        return None if np.isnan(x) else float(x)
+    return x
+
+
+############################################
+# Endpoints
+############################################
+
+def get_diagnostic(query: dict) -> dict:
+    """GET /diagnostic?at= : diagnostic at a given time (latest data if omitted)."""
+    try:
+        target_time = _parse_time(query.get("at"))
+        diag = decision.diagnostic(target_time=target_time)
+    except (ValueError, KeyError) as e:
+        raise HTTPError(400, str(e))
+    result = {k: _json_value(v) for k, v in diag.items()}
+    result["conclusion"] = concl_from_score(diag["score"])
+    return result
+
+
+def get_diagnostic_series(query: dict) -> dict:
+    """GET /diagnostic/series?start=&end= : score and components at every timestamp of the range (last 24 h by default)."""
+    data = data_processing.init_data()
+    try:
+        end = _parse_time(query.get("end"))
+        end = data.index.max() if end is None else end
+        start = _parse_time(query.get("start"))
+        start = end - pd.Timedelta(days=1) if start is None else start
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    if start > end:
+        raise HTTPError(400, "start doit précéder end")
+
+    series = decision.diagnostic_series(data, start=start, end=end)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "time": [t.isoformat() for t in series.index],
+        **{col: [None if np.isnan(v) else float(v) for v in series[col].to_numpy()] for col in series.columns},
+    }
+
+
+def get_window(query: dict) -> dict:
+    """GET /window?duration=&method=&severity= : best low-price window within the next <duration> hours."""
+    try:
+        duration = float(query.get("duration", WINDOW_RANGE))
+        severity = float(query.get("severity", OTSU_SEVERITY))
+        method = query.get("method", WINDOW_METHOD)
+        if method == WINDOW_METHOD and severity == OTSU_SEVERITY:
+            # Precomputed by the ingest worker when prices landed
+            start, end, eff_window = recommended_window(duration)
+        else:
+            start, end, eff_window = decision.price_window(
+                max_window=pd.Timedelta(hours=duration),
+                method=method,
+                severity=severity,
+            )
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    return {"start": start.isoformat(), "end": end.isoformat(), "eff_window": eff_window}
+
+
+# path -> (handler, data source it depends on, depends on the current quarter-hour, time parameters)
+ROUTES = {
+    "/diagnostic": (get_diagnostic, "eco2mix", False, ("at",)),
+    "/diagnostic/series": (get_diagnostic_series, "eco2mix", False, ("start", "end")),
+    "/window": (get_window, "prices", True, ()),
+}
+
+
+def validators(source: str, per_slot: bool, times=()):
+    """
+    ETag and Last-Modified of a resource: version of the data it is computed from
+    (and current quarter-hour for resources relative to now, resolved time parameters <times> for the others).
+    """
+    meta = VERSION["current"]["sources"].get(source, {"version": 0, "published_at": 0})
+    etag = f'"{source}-{meta["version"]}'
+    last_modified = meta["published_at"] or 0
+    if per_slot:
+        slot = int(time.time() // 900) * 900
+        etag += f"-{slot}"
+        last_modified = max(last_modified, slot)
+    for value in times:
+        etag += f"-{int(pd.Timestamp(value).timestamp())}"
+    return etag + '"', last_modified
+
+
+############################################
+# HTTP/1.1 server (keep-alive, GET only)
+############################################
+
+def _response(status: int, body: bytes = b"", headers: dict = None, keep_alive: bool = True) -> bytes:
+    reason = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}[status]
+    lines = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if body:
+        lines.append("Content-Type: application/json; charset=utf-8")
+    for k, v in (headers or {}).items():
+        lines.append(f"{k}: {v}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+async def handle_request(method: str, target: str, headers: dict) -> tuple:
+    """
+    :return: (status, body, headers)
+    """
+    if method != "GET":
+        return 405, json_dumps({"error": "GET only"}), {}
+
+    url = urlsplit(target)
+    route = ROUTES.get(url.path.rstrip("/") or "/")
+    if route is None:
+        return 404, json_dumps({"error": f"Unknown path {url.path}", "paths": list(ROUTES)}), {}
+    handler, source, per_slot, time_params = route
+
+    query = dict(parse_qsl(url.query))
+    relative = any(_is_relative(query[name]) for name in time_params if name in query)
+    if any(name in query for name in time_params):
+        try:
+            # dateparser can take a while: off the event loop
+            query = await asyncio.to_thread(resolve_times, query, time_params)
+        except ValueError as e:
+            return 400, json_dumps({"error": str(e)}), {}
+
+    etag, last_modified = validators(source, per_slot, [query[name] for name in time_params if name in query])
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not relative:
+        # The date of a relative time would not tell that it now points to another time: ETag only
+        cache_headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    # Conditional requests: nothing to compute
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return 304, b"", cache_headers
+    elif "if-modified-since" in headers and not relative:
+        try:
+            if parsedate_to_datetime(headers["if-modified-since"]).timestamp() >= int(last_modified):
+                return 304, b"", cache_headers
+        except (TypeError, ValueError):
+            pass
+
+    # Keyed on resolved times: a relative value is cached for what it points to now
+    key = (url.path, tuple(sorted(query.items())))
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == etag:
+        _cache.move_to_end(key)
+        return 200, cached[2], cache_headers
+
+    try:
+        # pandas work off the event loop so that other connections keep being served
+        result = await asyncio.to_thread(handler, query)
+    except HTTPError as e:
+        return e.status, json_dumps({"error": str(e)}), {}
+    except Exception as e:
+        return 500, json_dumps({"error": repr(e)}), {}
+
+    body = json_dumps(result)
+    _cache[key] = (etag, last_modified, body)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return 200, body, cache_headers
+
+
+async def _serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                writer.write(_response(400, json_dumps({"error": "Malformed request line"}), keep_alive=False))
+                break
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            status, body, extra = await handle_request(method, target, headers)
+            writer.write(_response(status, body, extra, keep_alive=keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def _follow_versions():
+    async for version, _ in watch_version(poll=1):
+        VERSION["current"] = version
+
+
+async def serve(host: str = API_HOST, port: int = API_PORT):
+    """
+    Read-only JSON API over the local data (same data as the bot): /diagnostic, /diagnostic/series, /window.
+    Responses carry ETag / Last-Modified tied to the published data version: polling clients sending
+    If-None-Match / If-Modified-Since get 304 responses without any computation.
+    """
+    server = await asyncio.start_server(_serve_connection, host, port)
+    follower = asyncio.create_task(_follow_versions())
+    print(f"[http_api] Listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        follower.cancel()
+
+
+############################################
+# Load test
+############################################
+
+async def load_test(
+        host: str = API_HOST,
+        port: int = API_PORT,
+        path: str = "/diagnostic",
+        connections: int = 50,
+        requests: int = 20_000,
+        conditional: bool = True
+        ) -> dict:
+    """
+    Hammer a running server over <connections> keep-alive connections.
+    With <conditional>, requests send the ETag received first (typical polling client) and mostly get 304s.
+
+    :return: {"requests", "seconds", "rps", "statuses", "p50_ms", "p99_ms"}
+    :rtype: dict
+    """
+    async def fetch(reader, writer, etag=None):
+        extra = f"If-None-Match: {etag}\r\n" if etag else ""
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n".encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = {k.strip().lower(): v.strip() for k, v in (line.split(":", 1) for line in lines[1:] if ":" in line)}
+        await reader.readexactly(int(headers.get("content-length", 0)))
+        return status, headers.get("etag")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, etag = await fetch(reader, writer)
+    writer.close()
+
+    per_connection = requests // connections
+    statuses, latencies = {}, []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(per_connection):
+            t0 = time.perf_counter()
+            status, _ = await fetch(reader, writer, etag if conditional else None)
+            latencies.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    seconds = time.perf_counter() - t0
+
+    latencies = np.array(latencies) * 1000
+    result = {
+        "requests": len(latencies),
+        "seconds": seconds,
+        "rps": len(latencies) / seconds,
+        "statuses": statuses,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+    print(f"{path}: {result['requests']} requests in {seconds:.2f}s → {result['rps']:.0f} req/s "
+          f"(p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, statuses {statuses})")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OvenTime local JSON API")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("serve")
+    run.add_argument("--host", default=API_HOST)
+    run.add_argument("--port", type=int, default=API_PORT)
+    bench = sub.add_parser("loadtest", help="Load test a running server (pin it to one core, e.g. taskset -c 0)")
+    bench.add_argument("--host", default=API_HOST)
+    bench.add_argument("--port", type=int, default=API_PORT)
+    bench.add_argument("--path", default="/diagnostic")
+    bench.add_argument("--connections", type=int, default=50)
+    bench.add_argument("--requests", type=int, default=20_000)
+    bench.add_argument("--unconditional", action="store_true", help="Do not send If-None-Match (full 200 responses)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port))
+    else:
+        asyncio.run(load_test(args.host, args.port, args.path, args.connections, args.requests, not args.unconditional))
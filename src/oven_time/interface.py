@@ -1,8 +1,9 @@
 from oven_time import decision
-from oven_time.config import TIMEZONE
+from oven_time.window_plan import recommended_window
+from oven_time.config import TIMEZONE, WINDOW_METHOD, OTSU_SEVERITY, WINDOW_RANGE
 
 import dateparser
-from pandas import Timestamp
+from pandas import Timestamp, Timedelta
 
 def time_interpreter(time_str, tz=TIMEZONE, freq="15min"):
     """
@@ -95,30 +96,32 @@ def get_diagnostic(
 
 
 def get_price_window(
-    duration: str = None,
-    method: str = "otsu",
-    severity: float = 1.0,
+    duration: float = None,
+    method: str = WINDOW_METHOD,
+    severity: float = OTSU_SEVERITY,
     tz_output: str = TIMEZONE
 ) -> str:
     """
-    Renvoie un message texte décrivant la prochaine bonne fenêtre de prix bas.
+    Renvoie un message texte décrivant la prochaine bonne fenêtre de prix bas dans les <duration> prochaines heures
+    (WINDOW_RANGE par défaut). Avec la méthode par défaut, la fenêtre est lue dans le plan précalculé (oven_time.window_plan).
     """
-    if duration is None:
-        start_utc, end_utc, eff_window = decision.price_window(method=method,severity=severity)
+    if method == WINDOW_METHOD and severity == OTSU_SEVERITY:
+        start_utc, end_utc, eff_window = recommended_window(duration)
+    else:
+        max_window = Timedelta(hours=WINDOW_RANGE if duration is None else duration)
+        start_utc, end_utc, eff_window = decision.price_window(max_window=max_window, method=method, severity=severity)
 
-        start_local = start_utc.tz_convert(tz_output)
-        end_local = end_utc.tz_convert(tz_output)
+    start_local = start_utc.tz_convert(tz_output)
+    end_local = end_utc.tz_convert(tz_output)
 
-        start_str = start_local.strftime("%H:%M")
-        end_str = end_local.strftime("%H:%M")
+    start_str = start_local.strftime("%H:%M")
+    end_str = end_local.strftime("%H:%M")
 
-        text = (
-            f"⚡🌱 Bonne fenêtre dans les {eff_window}h à venir : "
-            f"🕒 *{start_str}* à *{end_str}* 🕒\n"
-            f"👉 Bon moment pour lancer les gros consommateurs d'électricité"
-        )
-    else:
-        start_utc, end_utc, eff_window = decision.price_window(duration=duration,severity=severity)
+    text = (
+        f"⚡🌱 Bonne fenêtre dans les {eff_window}h à venir : "
+        f"🕒 *{start_str}* à *{end_str}* 🕒\n"
+        f"👉 Bon moment pour lancer les gros consommateurs d'électricité"
+    )
 
     return text
 
@@ -0,0 +1,184 @@
+"""Structured logs of the ingest worker and the bot: JSON lines written by a background thread."""
+import io
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from oven_time.config import LOG_LEVEL
+
+# Chatty third-party loggers (one line per HTTP request, per scheduled job)
+QUIET_LOGGERS = ("httpx", "apscheduler")
+
+_LISTENER = {"listener": None}
+
+
+class JsonFormatter(logging.Formatter):
+    """Record → JSON line: timestamp, level, logger, event (message) and the fields passed to log_event."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler leaving the JSON formatting to the listener thread: the queue never leaves the process, so records
+    are handed over as they are, once their message is built.
+    """
+
+    def prepare(self, record):
+        # Message arguments may be mutable objects still in use by the caller: merged into the message now,
+        # so that the line shows them as they were when logged
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None, path=None) -> QueueListener:
+    """
+    Route every log record of the process to <stream> (stdout by default) or to the file <path> as JSON lines,
+    through a queue drained by a background thread. Idempotent; records still queued are written at exit.
+
+    :param level: Minimum level of the root logger
+    :param stream: Text stream to write to
+    :param path: File to append to instead
+    :return: The running listener
+    """
+    if _LISTENER["listener"] is not None:
+        return _LISTENER["listener"]
+
+    if path is not None:
+        handler = logging.FileHandler(path, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+    handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for previous in list(root.handlers):
+        root.removeHandler(previous)
+    root.addHandler(_InProcessQueueHandler(records))
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    listener.start()
+    atexit.register(stop_logging)
+    _LISTENER["listener"] = listener
+    return listener
+
+
+def stop_logging():
+    """Write the records still queued and stop the background thread."""
+    listener = _LISTENER["listener"]
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        _LISTENER["listener"] = None
+
+
+def log_event(
+        logger: logging.Logger,
+        event: str,
+        level: int = logging.INFO,
+        sample_rate: float = 1.0,
+        exc_info: bool = False,
+        **fields
+        ):
+    """
+    Log <event> with structured <fields> (source, rows_added, duration_ms, version...).
+
+    :param exc_info: Attach the exception being handled (traceback in the "exc" field)
+    :param sample_rate: Share of the calls actually logged, for high-volume events (per request).
+        Sampled events carry their sample_rate, so that counts can be scaled back.
+    """
+    if sample_rate < 1:
+        if random.random() >= sample_rate:
+            return
+        fields["sample_rate"] = sample_rate
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+class _SlowStream(io.StringIO):
+    """Output that takes <latency> seconds per write (full pipe, slow terminal or log collector)."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def write(self, text):
+        time.sleep(self.latency)
+        return super().write(text)
+
+
+def benchmark(n: int = 20_000, slow_latency: float = 0.001) -> dict:
+    """
+    Time spent in the calling thread (the bot's event loop) per log call: print, synchronous JSON logging handler,
+    queued JSON logging, and a per-command event sampled at LOG_SAMPLE_RATE. Measured on a temporary file and on
+    an output taking <slow_latency> seconds per write.
+
+    :return: {output: {variant: microseconds per call}}
+    :rtype: dict
+    """
+    import tempfile
+    from oven_time.config import LOG_SAMPLE_RATE
+
+    fields = {"source": "bot", "command": "m", "duration_ms": 4.2, "wait_ms": 0.1}
+    logger = logging.getLogger("oven_time.logs.benchmark")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    def per_call(call, calls):
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            call()
+        return (time.perf_counter() - t0) / calls * 1e6
+
+    result = {}
+    with tempfile.TemporaryFile("w+") as file:
+        for name, out, calls in (("file", file, n), ("slow", _SlowStream(slow_latency), max(1, n // 100))):
+            result[name] = timings = {}
+            timings["print"] = per_call(lambda: print(f"[bot] command m handled in {fields['duration_ms']} ms", file=out), calls)
+
+            handler = logging.StreamHandler(out)
+            handler.setFormatter(JsonFormatter())
+            logger.addHandler(handler)
+            timings["logging_sync"] = per_call(lambda: log_event(logger, "command", **fields), calls)
+            logger.removeHandler(handler)
+
+            records = queue.SimpleQueue()
+            queue_handler = _InProcessQueueHandler(records)
+            listener = QueueListener(records, handler)
+            logger.addHandler(queue_handler)
+            listener.start()
+            timings["logging_queued"] = per_call(lambda: log_event(logger, "command", **fields), calls)
+            timings["logging_queued_sampled"] = per_call(
+                lambda: log_event(logger, "command", sample_rate=LOG_SAMPLE_RATE, **fields), calls)
+            listener.stop()
+            logger.removeHandler(queue_handler)
+
+            print(f"Time in the calling thread per log call ({name} output): "
+                  + ", ".join(f"{k} {v:.1f} µs" for k, v in timings.items()))
+    return result
+
+
+if __name__ == "__main__":
+    benchmark()
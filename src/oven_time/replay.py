@@ -0,0 +1,255 @@
+"""
+Time-travel replay of the production pipeline: recorded eco2mix data and day-ahead prices are fed through the real
+ingest cycle (oven_time.worker.ingest_cycle → update_* → processed data, window plan, data versions) and the real
+alert fan-out (bot_commands.check_score_job), under a simulated clock (oven_time.clock) that jumps from one worker
+cycle to the next. Alerts are delivered to the fake Bot API of oven_time.bot_loadtest.
+
+Runs on a scratch data directory like the bot load test: run it with `python -m oven_time.replay`
+(or import it before any other oven_time module).
+
+Window reminders are not replayed: they are scheduled on the JobQueue, which follows the system clock.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from pathlib import Path
+
+from oven_time.bot_loadtest import TOKEN, FakeBotAPI, synthetic_eco2mix, synthetic_prices, _percentiles
+
+import numpy as np
+import pandas as pd
+import psutil
+from entsoe.exceptions import NoMatchingDataError
+from telegram.ext import ApplicationBuilder
+
+from oven_time.clock import SimulatedClock, use_clock
+from oven_time.logs import setup_logging
+from oven_time.worker import ingest_cycle
+from oven_time.bot_commands import ALERT_TEXTS, get_subscribers, check_score_job
+from oven_time.config import DATA_DIR, RETENTION_DAYS, WORKER_FREQ, TIMEZONE, HIGH_SCORE_THRESHOLD, LOW_SCORE_THRESHOLD
+
+# Alert kind of a delivered message, from the fixed part of its text
+ALERT_KINDS = {text.split("{")[0]: kind for kind, text in ALERT_TEXTS.items()}
+
+
+############################################
+# Recorded sources
+############################################
+
+class RecordedEco2mix:
+    """
+    Stand-in for data_download.eco2mix_raw: pages of recorded eco2mix rows, each row being published
+    <delay> after its timestamp (as seen from <clock>).
+    """
+
+    def __init__(self, data: pd.DataFrame, clock, delay: pd.Timedelta = pd.Timedelta(minutes=15)):
+        data = data.sort_index()
+        self.index = data.index
+        self.clock = clock
+        self.delay = delay
+        # Records as the API returns them (ISO timestamps, None for missing values), built once
+        records = data.astype(object).where(data.notna(), None)
+        records.insert(0, "date_heure", [ts.isoformat() for ts in data.index])
+        self.records = records.to_dict("records")
+        self.calls = 0
+
+    def __call__(self, start, end, limit: int = 100, **kwargs) -> list:
+        self.calls += 1
+        end = min(pd.Timestamp(end), self.clock() - self.delay)
+        lo = self.index.searchsorted(pd.Timestamp(start), side="left")
+        hi = self.index.searchsorted(end, side="right")
+        return self.records[lo:min(hi, lo + limit)]
+
+
+class RecordedPrices:
+    """
+    Stand-in for the ENTSO-E client: recorded day-ahead prices, the prices of each market day being published
+    the day before at <publication> (local time), as seen from <clock>.
+    """
+
+    def __init__(self, prices: pd.Series, clock, publication: str = "13:00", tz: str = TIMEZONE):
+        self.prices = prices.sort_index()
+        self.clock = clock
+        self.publication = pd.Timedelta(publication + ":00")
+        self.tz = tz
+        self.calls = 0
+
+    def query_day_ahead_prices(self, country_code, start, end):
+        self.calls += 1
+        # Published up to the end of tomorrow after the auction, up to the end of today before
+        published_until = (self.clock().tz_convert(self.tz) - self.publication).floor("D") + pd.DateOffset(days=2)
+        end = min(pd.Timestamp(end), published_until - pd.Timedelta(minutes=15))
+        series = self.prices[(self.prices.index >= start) & (self.prices.index <= end)]
+        if series.empty:
+            raise NoMatchingDataError
+        return series.tz_convert(self.tz)
+
+
+def synthetic_recording(start, days: int, seed: int = 0) -> tuple:
+    """Synthetic eco2mix data and prices over <days> days from <start> (see oven_time.bot_loadtest)."""
+    start = pd.Timestamp(start).floor("D")
+    index = pd.date_range(start, start + pd.Timedelta(days=days), freq="15min", inclusive="left", name="date_heure")
+    price_index = pd.date_range(start, start + pd.Timedelta(days=days + 2), freq="15min", inclusive="left")
+    return synthetic_eco2mix(index, seed), synthetic_prices(price_index, seed)["price"]
+
+
+############################################
+# Replay
+############################################
+
+async def replay(
+        eco2mix: pd.DataFrame,
+        prices: pd.Series,
+        start: pd.Timestamp = None,
+        days: float = 7,
+        speed: float = None,
+        subscribers: int = 1000,
+        blocked: float = 0.01,
+        seed: int = 0,
+        verbose: bool = True
+        ) -> dict:
+    """
+    Replay <days> days of operations from <start>, one ingest cycle every WORKER_FREQ simulated minutes.
+    The pipeline starts from an empty data directory, as a fresh deployment would: the recording has to cover
+    RETENTION_DAYS before <start>.
+
+    :param eco2mix: Recorded raw eco2mix data (UTC index, API columns)
+    :param prices: Recorded day-ahead prices (UTC index)
+    :param start: Simulated start. None → RETENTION_DAYS after the start of the recording.
+    :param days: Simulated duration (in days)
+    :param speed: Simulated seconds per wall-clock second (e.g. 10_000). None → as fast as possible.
+    :param subscribers: Chats subscribed to score alerts, with thresholds spread around the defaults
+    :param blocked: Share of subscribers who blocked the bot (purged at their first alert)
+    :return: Alerts sent, ingest and alert timings, memory, replay speed
+    :rtype: dict
+    """
+    def log(msg):
+        if verbose:
+            print(msg)
+
+    start = eco2mix.index.min().ceil("D") + pd.Timedelta(days=RETENTION_DAYS) if start is None else pd.Timestamp(start)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = start + pd.Timedelta(days=days)
+    step = pd.Timedelta(minutes=WORKER_FREQ)
+    log_file = DATA_DIR / "replay.log"
+    setup_logging(path=log_file)
+
+    sim_clock = SimulatedClock(start)
+    eco2mix_fetch = RecordedEco2mix(eco2mix, sim_clock)
+    price_client = RecordedPrices(prices, sim_clock)
+
+    alerts = []  # (simulated time, chat_id, kind)
+
+    def on_message(chat_id, text):
+        kind = next((kind for prefix, kind in ALERT_KINDS.items() if text.startswith(prefix)), None)
+        if kind is not None:
+            alerts.append((sim_clock(), chat_id, kind))
+
+    api = FakeBotAPI(latency=0, on_message=on_message)
+    app = ApplicationBuilder().token(TOKEN).request(api).get_updates_request(FakeBotAPI(latency=0)).build()
+    await app.initialize()
+
+    rng = random.Random(seed)
+    store = get_subscribers(app)
+    for chat_id in range(1, subscribers + 1):
+        store.add(chat_id, high=HIGH_SCORE_THRESHOLD + rng.uniform(-30, 30), low=LOW_SCORE_THRESHOLD + rng.uniform(-30, 30))
+    store.flush()
+    api.blocked = set(rng.sample(range(1, subscribers + 1), int(subscribers * blocked)))
+
+    process = psutil.Process()
+    memory = [(start, process.memory_info().rss / 2**20)]
+    timings = {"eco2mix": [], "prices": [], "check_score": [], "cycle": []}
+    state = {}
+    cycles = 0
+    log(f"Replaying {days:g} days from {start} in {DATA_DIR} ({subscribers} subscribers)")
+
+    t0 = time.perf_counter()
+    with use_clock(sim_clock):
+        while sim_clock() < end:
+            cycle_start = time.perf_counter()
+            previous = state.get("eco2mix")
+            for name, seconds in ingest_cycle(state, eco2mix_fetch=eco2mix_fetch, price_client=price_client, verbose=False).items():
+                timings[name].append(seconds)
+
+            # What watch_data_job does in the bot process when a new eco2mix version is published
+            if state.get("eco2mix") != previous:
+                check_start = time.perf_counter()
+                await check_score_job(app)
+                timings["check_score"].append(time.perf_counter() - check_start)
+
+            timings["cycle"].append(time.perf_counter() - cycle_start)
+            cycles += 1
+            if cycles % 288 == 0:
+                memory.append((sim_clock(), process.memory_info().rss / 2**20))
+                log(f"[{sim_clock()}] {cycles} cycles, {len(alerts)} alerts, "
+                    f"{(sim_clock() - start).total_seconds() / (time.perf_counter() - t0):,.0f}x")
+
+            sim_clock.advance(step)
+            if speed:
+                ahead = (sim_clock() - start).total_seconds() / speed - (time.perf_counter() - t0)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+    elapsed = time.perf_counter() - t0
+    memory.append((sim_clock(), process.memory_info().rss / 2**20))
+
+    await app.shutdown()
+    store.close()
+
+    kinds = Counter(kind for _, _, kind in alerts)
+    result = {
+        "start": str(start),
+        "end": str(end),
+        "cycles": cycles,
+        "seconds": elapsed,
+        "speedup": (end - start).total_seconds() / elapsed,
+        "alerts": {
+            "sent": len(alerts),
+            "by_kind": dict(kinds),
+            "broadcasts": sorted({str(t) for t, _, _ in alerts}),
+        },
+        "timings": {name: {"total_s": float(np.sum(values)), **_percentiles(values)} for name, values in timings.items()},
+        "rss_mb": [(str(t), mb) for t, mb in memory],
+        "source_calls": {"eco2mix": eco2mix_fetch.calls, "prices": price_client.calls},
+        "api_calls": dict(api.calls),
+    }
+
+    log(f"\n{days:g} simulated days in {elapsed:.1f}s → {result['speedup']:,.0f}x real time ({cycles} worker cycles)")
+    for name, stats in result["timings"].items():
+        if stats["n"]:
+            log(f"  {name:<12} n={stats['n']:<6} total {stats['total_s']:7.2f} s   p50 {stats['p50_ms']:7.1f} ms   "
+                f"p99 {stats['p99_ms']:7.1f} ms   max {stats['max_ms']:7.1f} ms")
+    log(f"  alerts: {len(alerts)} messages in {len(result['alerts']['broadcasts'])} broadcasts {dict(kinds)}")
+    log(f"  RSS: {memory[0][1]:.0f} MB → {max(mb for _, mb in memory):.0f} MB peak → {memory[-1][1]:.0f} MB at the end")
+    log(f"  source calls: {result['source_calls']}, Bot API calls: {dict(api.calls)}")
+    log(f"  pipeline logs: {log_file}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accelerated replay of the OvenTime ingest and alert pipeline")
+    parser.add_argument("--eco2mix", type=Path, help="Recorded raw eco2mix data (parquet). Synthetic if omitted.")
+    parser.add_argument("--prices", type=Path, help="Recorded day-ahead prices (parquet). Synthetic if omitted.")
+    parser.add_argument("--start", help="Simulated start (UTC). Default: RETENTION_DAYS after the start of the recording.")
+    parser.add_argument("--days", type=float, default=7, help="Simulated days")
+    parser.add_argument("--speed", type=float, help="Speed-up factor (e.g. 10000). Default: as fast as possible.")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Write the full result to this file")
+    args = parser.parse_args()
+
+    if args.eco2mix is None or args.prices is None:
+        first = pd.Timestamp.now(tz="UTC").floor("D") - pd.Timedelta(days=RETENTION_DAYS + args.days + 1)
+        eco2mix, prices = synthetic_recording(first, RETENTION_DAYS + int(np.ceil(args.days)) + 1, seed=args.seed)
+    if args.eco2mix is not None:
+        eco2mix = pd.read_parquet(args.eco2mix)
+    if args.prices is not None:
+        prices = pd.read_parquet(args.prices)["price"]
+
+    result = asyncio.run(replay(
+        eco2mix, prices, start=args.start, days=args.days, speed=args.speed, subscribers=args.subscribers, seed=args.seed,
+    ))
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
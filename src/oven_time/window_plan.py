@@ -0,0 +1,144 @@
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+from oven_time import clock
+from oven_time.decision import price_window, load_prices
+from oven_time.backtest import otsu_thresholds, longest_low_run
+from oven_time.data_download import atomic_to_parquet
+from oven_time.logs import log_event
+from oven_time.config import DATA_DIR, WINDOW_PLAN_DURATIONS, WINDOW_METHOD, OTSU_SEVERITY, WINDOW_RANGE
+
+PLAN_FILE = DATA_DIR / "processed" / "window_plan.parquet"
+STEP = pd.Timedelta(minutes=15)
+
+logger = logging.getLogger(__name__)
+
+
+def build_plan(
+        prices: pd.Series = None,
+        durations=WINDOW_PLAN_DURATIONS,
+        method: str = WINDOW_METHOD,
+        severity: float = OTSU_SEVERITY,
+        since: pd.Timestamp = None,
+        relative_low: float = 0.30,
+        absolute_low: float = 10
+        ) -> pd.DataFrame:
+    """
+    What `decision.price_window` recommends at every quarter-hour from <since> to the last known price, for each horizon
+    of <durations>. Day-ahead prices change once a day, so the whole plan only needs to be computed when new prices land.
+
+    Slots whose horizon is fully covered by prices are computed in one vectorized pass per horizon
+    (see backtest.evaluate_price_windows), the last ones (horizon cut by the end of the prices) one by one.
+
+    :param prices: Day-ahead prices (UTC index). None → local price data.
+    :param durations: Horizons (in hours)
+    :param since: First slot of the plan. None → current quarter-hour.
+    :return: Plan indexed by (as_of, hours), columns start, end (NaT when there is no window) and eff_window
+    :rtype: pd.DataFrame
+    """
+    if prices is None:
+        prices = load_prices()
+    prices = prices.sort_index()
+    prices = prices[~prices.index.duplicated(keep="last")]
+    since = (clock.now() if since is None else since).floor("15min")
+
+    future = prices[prices.index >= since]
+    slots = future.index
+    values = future.to_numpy(dtype=float)
+    # Vectorized path only on a regular 15-minute grid without gaps, where windows are plain array slices
+    regular = len(slots) > 1 and not np.isnan(values).any() and (slots[1:] - slots[:-1] == STEP).all()
+
+    frames = []
+    for hours in durations:
+        horizon = pd.Timedelta(hours=hours)
+        m = int(horizon / STEP) + 1
+        n_full = len(values) - m + 1 if regular and len(values) >= m else 0
+        start = pd.Series(pd.NaT, index=slots, dtype="datetime64[ns, UTC]")
+        end = start.copy()
+        eff_window = pd.Series(int((m - 1) * STEP / pd.Timedelta(hours=1)), index=slots)
+
+        if n_full > 0:
+            windows = np.lib.stride_tricks.sliding_window_view(values, m)
+            if method == "otsu":
+                thresholds = otsu_thresholds(windows, severity=severity)
+            else:
+                lo, hi = windows.min(axis=1), windows.max(axis=1)
+                thresholds = np.maximum(lo + relative_low * (hi - lo), absolute_low)
+            offset, length = longest_low_run(windows, thresholds)
+            found = ~np.isnan(thresholds) & (length > 0)
+            base = slots[:n_full]
+            start.iloc[:n_full] = (base + offset * STEP).where(found)
+            end.iloc[:n_full] = (base + (offset + length) * STEP).where(found)
+
+        for i in range(n_full, len(slots)):
+            try:
+                start.iloc[i], end.iloc[i], eff_window.iloc[i] = price_window(
+                    max_window=horizon, method=method, severity=severity,
+                    relative_low=relative_low, absolute_low=absolute_low, as_of=slots[i], prices=prices,
+                )
+            except ValueError:
+                eff_window.iloc[i] = int((prices.index.max() - slots[i]) / pd.Timedelta(hours=1))
+
+        frames.append(pd.DataFrame({"hours": float(hours), "start": start, "end": end, "eff_window": eff_window})
+                      .rename_axis("as_of").set_index("hours", append=True))
+
+    return pd.concat(frames).sort_index()
+
+
+def update_plan(prices: pd.Series = None, verbose: bool = True) -> pd.DataFrame:
+    """
+    Compute the plan from now on and write it for the bot (called by the ingest worker when new prices land).
+    """
+    t0 = time.perf_counter()
+    plan = build_plan(prices)
+    PLAN_FILE.parent.mkdir(parents=True, exist_ok=True)
+    atomic_to_parquet(plan, PLAN_FILE)
+    log_event(logger, "update", level=logging.INFO if verbose else logging.DEBUG, source="window_plan",
+              rows_added=len(plan), last_timestamp=plan.index.get_level_values("as_of").max(),
+              duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+    return plan
+
+
+_PLAN = {"mtime": None, "plan": None, "lookup": None}
+
+def load_plan() -> pd.DataFrame:
+    """Window plan written by the ingest worker, kept in memory until the file is rewritten."""
+    mtime = PLAN_FILE.stat().st_mtime_ns
+    if _PLAN["mtime"] != mtime:
+        plan = pd.read_parquet(PLAN_FILE)
+        _PLAN["plan"] = plan
+        # (as_of, hours) -> (start, end, eff_window), for constant-time lookups from the bot
+        _PLAN["lookup"] = dict(zip(plan.index, zip(plan["start"], plan["end"], plan["eff_window"].astype(int))))
+        _PLAN["mtime"] = mtime
+    return _PLAN["plan"]
+
+
+def recommended_window(hours: float = None, as_of: pd.Timestamp = None) -> tuple:
+    """
+    Same result as `decision.price_window(max_window=hours, method=WINDOW_METHOD, severity=OTSU_SEVERITY, as_of=as_of)`,
+    read from the plan when it covers <hours> and <as_of>, computed otherwise.
+
+    :param hours: Horizon (in hours). None → WINDOW_RANGE.
+    :param as_of: Time of the recommendation. None → now.
+    :return: (start, end, eff_window)
+    :raises ValueError: No low-price window within the horizon
+    """
+    hours = float(WINDOW_RANGE if hours is None else hours)
+    slot = (clock.now() if as_of is None else as_of).floor("15min")
+    try:
+        load_plan()
+        start, end, eff_window = _PLAN["lookup"][(slot, hours)]
+    except (FileNotFoundError, KeyError):
+        return price_window(max_window=pd.Timedelta(hours=hours), method=WINDOW_METHOD, severity=OTSU_SEVERITY, as_of=slot)
+    if pd.isna(start):
+        raise ValueError("No prices below the computed threshold.")
+    return start, end, eff_window
+
+
+if __name__ == "__main__":
+    from oven_time.logs import setup_logging
+    setup_logging()
+    print(update_plan())
@@ -0,0 +1,95 @@
+import time
+import logging
+
+from oven_time import data_processing, window_plan
+from oven_time.data_download import should_update_eco2mix, update_eco2mix_data, should_update_prices, update_price_data
+from oven_time.data_version import publish_version
+from oven_time.logs import log_event, setup_logging
+from oven_time.config import WORKER_FREQ
+
+logger = logging.getLogger(__name__)
+
+
+def publish(source: str, last_timestamp):
+    """Publish a new version of <source> and log it."""
+    version = publish_version(source, last_timestamp)
+    log_event(logger, "publish", source=source, version=version["sources"][source]["version"],
+              data_version=version["version"], last_timestamp=last_timestamp)
+
+
+def ingest_cycle(state: dict, eco2mix_fetch=None, price_client=None, verbose: bool = True) -> dict:
+    """
+    Run one ingest cycle: update eco2mix and price data if worth trying, update processed data and the window plan,
+    and publish a new data version for each dataset that actually changed.
+
+    :param state: Last complete timestamps per source, updated in place ({"eco2mix": ..., "prices": ...})
+    :type state: dict
+    :param eco2mix_fetch: Source of eco2mix records (see update_eco2mix_data). None → eco2mix API.
+    :param price_client: Source of day-ahead prices (see update_price_data). None → ENTSO-E API.
+    :param verbose: Logging
+    :type verbose: bool
+    :return: Duration (in seconds) of each step that ran during this cycle
+    :rtype: dict
+    """
+    timings = {}
+
+    # --- 1. Update eco2mix ---
+    if should_update_eco2mix(state.get("eco2mix")):
+        t0 = time.perf_counter()
+        try:
+            last_timestamp = update_eco2mix_data(fetch=eco2mix_fetch, verbose=verbose)
+        except Exception:
+            log_event(logger, "update_failed", level=logging.ERROR, exc_info=True, source="eco2mix")
+        else:
+            if last_timestamp is not None and last_timestamp != state.get("eco2mix"):
+                state["eco2mix"] = last_timestamp
+                # Derived data is written here so that the bot never has to (only the new rows are derived)
+                data_processing.update_processed(verbose=verbose)
+                publish("eco2mix", last_timestamp)
+        timings["eco2mix"] = time.perf_counter() - t0
+
+    # --- 2. Update prices if needed ---
+    if should_update_prices(state.get("prices")):
+        t0 = time.perf_counter()
+        try:
+            last_timestamp = update_price_data(client=price_client, verbose=verbose)
+        except Exception:
+            log_event(logger, "update_failed", level=logging.ERROR, exc_info=True, source="prices")
+        else:
+            if last_timestamp is not None and (last_timestamp != state.get("prices") or not window_plan.PLAN_FILE.exists()):
+                state["prices"] = last_timestamp
+                # Recommended windows of the day, computed once for the bot (/q, window reminders)
+                window_plan.update_plan(verbose=verbose)
+                publish("prices", last_timestamp)
+        timings["prices"] = time.perf_counter() - t0
+
+    return timings
+
+
+def run_worker(freq: int = WORKER_FREQ, once: bool = False, verbose: bool = True):
+    """
+    Ingest loop, meant to run in its own process next to the bot.
+    The bot only reads the data written here and reacts to published versions (see oven_time.data_version).
+
+    :param freq: Time between two update attempts (in minutes)
+    :type freq: int
+    :param once: Run a single cycle and return its timings (benchmarking)
+    :type once: bool
+    :param verbose: Logging
+    :type verbose: bool
+    """
+    setup_logging()
+    state = {}
+    while True:
+        t0 = time.perf_counter()
+        timings = ingest_cycle(state, verbose=verbose)
+        timings["total"] = time.perf_counter() - t0
+        log_event(logger, "ingest_cycle", **{f"{k}_ms": round(v * 1000, 1) for k, v in timings.items()})
+
+        if once:
+            return timings
+        time.sleep(freq * 60)
+
+
+if __name__ == "__main__":
+    run_worker(once=True)